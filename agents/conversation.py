@@ -0,0 +1,75 @@
+"""
+Conversation state for multi-turn question answering over one document set. Key features include:
+
+1. A bounded window of prior turns (question, standalone question, answer, relevance label)
+2. The IDs of the chunks each turn retrieved
+3. Overlap accounting: how many of a follow-up's chunks were already in an earlier turn's context,
+   which decides whether the relevance check can be skipped
+
+Chunks are not carried over between turns: retrieval runs for every standalone question, and the
+stateless LLM prompts need every chunk they use, so there is no fetch or prompt to save for them.
+"""
+
+import hashlib
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from config.settings import settings
+
+
+def chunk_id(document: Document) -> str:
+    """ID of a chunk: its chunk store ID if it has one, else derived from its content."""
+    return document.id or hashlib.sha256(document.page_content.encode()).hexdigest()[:16]
+
+
+class ConversationTurn:
+    __slots__ = ("question", "standalone_question", "answer", "chunk_ids", "relevance_label")
+
+    def __init__(self, question: str, standalone_question: str, answer: str, chunk_ids: List[str],
+                 relevance_label: str):
+        self.question = question
+        self.standalone_question = standalone_question
+        self.answer = answer
+        self.chunk_ids = chunk_ids
+        self.relevance_label = relevance_label
+
+
+class ConversationSession:
+    def __init__(self, max_turns: Optional[int] = None):
+        self.turns = deque(maxlen=max_turns or settings.SESSION_MAX_TURNS)
+        self.turn_count = 0  # Turns since the conversation started, including those out of the window
+        self._retriever = None
+        self._lock = threading.Lock()  # Questions from one browser session can overlap
+
+    def bind(self, retriever) -> None:
+        """Start over if the conversation moves to a different retriever (document set)."""
+        with self._lock:
+            if retriever is not self._retriever:
+                self.turns.clear()
+                self.turn_count = 0
+                self._retriever = retriever
+
+    @property
+    def last_relevance_label(self) -> Optional[str]:
+        return self.turns[-1].relevance_label if self.turns else None
+
+    def history(self, answer_chars: int = 300) -> List[Tuple[str, str]]:
+        """(standalone question, truncated answer) pairs of the turns in the window, oldest first."""
+        with self._lock:
+            return [(turn.standalone_question, turn.answer[:answer_chars]) for turn in self.turns]
+
+    def seen(self, documents: List[Document]) -> int:
+        """How many of `documents` were already retrieved by a turn in the window."""
+        with self._lock:
+            seen = {i for turn in self.turns for i in turn.chunk_ids}
+        return sum(chunk_id(document) in seen for document in documents)
+
+    def add_turn(self, question: str, standalone_question: str, answer: str, documents: List[Document],
+                 relevance_label: str) -> None:
+        ids = [chunk_id(document) for document in documents]
+        with self._lock:
+            self.turns.append(ConversationTurn(question, standalone_question, answer, ids, relevance_label))
+            self.turn_count += 1
@@ -0,0 +1,114 @@
+"""
+Per-call model routing between a small and a large chat model. Key features include:
+
+1. Each agent call asks the router for a route ("small" or "large") based on question length,
+   retrieved-context size, the relevance label and the previous verification outcome
+2. Policies are configurable: "adaptive" (the signals above), "large" (the original fixed
+   assignment: 70B for relevance and research, 8B for verification) or "small" (8B everywhere)
+3. Research answers from the small model that fail verification are escalated to the large model
+4. Per-route latency, token usage and cost are recorded in the metrics registry
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+from config.settings import settings
+from utils.instrumentation import get_trace_id, metrics, record_llm_usage, timed
+from utils.logging import logger
+from utils.tokens import count_tokens
+
+POLICIES = ("adaptive", "large", "small")
+_SMALL_MODEL_TASKS = ("verification", "condense")  # Sent to the small model under every policy
+
+
+class ModelRouter:
+    def __init__(self, small=None, large=None, policy: Optional[str] = None, costs: Optional[Dict] = None):
+        """
+        * `small` / `large` are chat models; by default Groq clients for settings.SMALL_MODEL and
+          settings.LARGE_MODEL are created (pass the same model twice to disable routing)
+        * `costs` maps model names to USD per million (prompt, completion) tokens
+        """
+        if small is None or large is None:
+            from langchain_openai import ChatOpenAI
+
+            api_key = settings.require("GROQ_API_KEY")
+            small = small or ChatOpenAI(model=settings.SMALL_MODEL, base_url=settings.GROQ_BASE_URL, api_key=api_key)
+            large = large or ChatOpenAI(model=settings.LARGE_MODEL, base_url=settings.GROQ_BASE_URL, api_key=api_key)
+
+        self.policy = policy or settings.MODEL_ROUTING_POLICY
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown routing policy: {self.policy}")
+        self.models = {"small": small, "large": large}
+        self.costs = settings.MODEL_COSTS if costs is None else costs
+
+    @classmethod
+    def fixed(cls, model) -> "ModelRouter":
+        """Router that sends every call to `model`."""
+        return cls(small=model, large=model, policy="small")
+
+    def model_name(self, route: str) -> str:
+        return self.models[route].model_name
+
+    def choose(self, task: str, question: str = "", context: str = "", relevance: Optional[str] = None,
+               previous_verification=None, previous_route: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Pick the route for one call of `task` ("relevance", "research", "verification" or "condense").
+
+        Returns (route, reason).
+        """
+        if self.policy == "small":
+            return "small", "policy"
+        if self.policy == "large":
+            return ("small" if task in _SMALL_MODEL_TASKS else "large"), "policy"
+
+        if task in _SMALL_MODEL_TASKS:
+            # Checking an answer against its context, or rewriting a question, needs no large model
+            return "small", task
+        if task == "research" and previous_verification is not None and not previous_verification.passed:
+            if previous_route == "small":
+                metrics.observe("routing.escalations", 1)
+                return "large", "escalation"
+            return "large", "failed_verification"
+        if count_tokens(question) > settings.ROUTING_MAX_QUESTION_TOKENS:
+            return "large", "long_question"
+        if count_tokens(context) > settings.ROUTING_MAX_CONTEXT_TOKENS:
+            return "large", "large_context"
+        if task == "research" and relevance == "PARTIAL":
+            # Partial coverage needs more careful synthesis from incomplete passages
+            return "large", "partial_relevance"
+        return "small", "simple"
+
+    def invoke(self, task: str, route: str, prompt: str, **call_kwargs):
+        """
+        Send `prompt` to the route's model and record latency, tokens and cost.
+
+        `call_kwargs` (temperature, max_completion_tokens, response_format, ...) are bound per call.
+        """
+        model = self.models[route]
+        name = model.model_name
+        runnable = model.bind(**call_kwargs) if call_kwargs else model
+
+        start = time.perf_counter()
+        with timed(f"llm.{task}", route=route, model=name):
+            response = runnable.invoke(prompt)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        usage = record_llm_usage(f"llm.{task}", response, model=name)
+        prompt_cost, completion_cost = self.costs.get(name, (0.0, 0.0))
+        cost = (usage["prompt_tokens"] * prompt_cost + usage["completion_tokens"] * completion_cost) / 1_000_000
+        metrics.observe(f"routing.{task}.{route}.latency_ms", latency_ms)
+        metrics.observe(f"routing.{task}.{route}.cost_usd", cost)
+        return response
+
+    def route(self, task: str, **signals) -> str:
+        """choose(), logging the decision."""
+        route, reason = self.choose(task, **signals)
+        logger.bind(
+            metric="route",
+            trace_id=get_trace_id(),
+            task=task,
+            route=route,
+            model=self.model_name(route),
+            reason=reason,
+        ).info(f"Routing {task} to the {route} model ({reason})")
+        return route
@@ -0,0 +1,82 @@
+"""
+The QueryCondenser rewrites a follow-up question ("and what about 2023?") into a standalone query
+using the recent turns of the conversation, so retrieval and the other agents see a complete question.
+
+Questions that don't look like follow-ups are returned unchanged without calling the LLM.
+"""
+import re
+from typing import List, Optional
+from .model_router import ModelRouter
+from utils.logging import logger, log_payload
+
+_FOLLOW_UP_START = re.compile(r"^\s*(and|but|also|what about|how about)\b", re.IGNORECASE)
+_REFERENCE_WORDS = re.compile(r"\b(it|its|they|them|their|this|that|these|those|he|she|his|her|the same|above|previous)\b",
+                              re.IGNORECASE)
+# Narrower than the above: words that almost always point back at an earlier turn
+_BACK_REFERENCES = re.compile(r"\b(it|its|they|them|their|he|him|his|she|her)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+")
+
+
+class QueryCondenser:
+    def __init__(self, model=None, router: Optional[ModelRouter] = None):
+        # Route each call between the small and large LLM (a single preconfigured chat model
+        # can be passed in instead, e.g. for benchmarks)
+        self.router = router or (ModelRouter.fixed(model) if model is not None else ModelRouter())
+
+    def is_follow_up(self, question: str) -> bool:
+        """Cheap check for questions that may depend on earlier turns (errs towards condensing)."""
+        return bool(_FOLLOW_UP_START.search(question) or _REFERENCE_WORDS.search(question)
+                    or len(question.split()) <= 4)
+
+    def refers_back(self, question: str) -> bool:
+        """Stricter check: the question continues an earlier turn ("and ...", "what about ...") or uses a pronoun for it."""
+        return bool(_FOLLOW_UP_START.search(question) or _BACK_REFERENCES.search(question))
+
+    @staticmethod
+    def was_condensed(question: str, standalone_question: str) -> bool:
+        """True if condensing changed the words of the question, not just its case or punctuation."""
+        return _WORD_RE.findall(question.lower()) != _WORD_RE.findall(standalone_question.lower())
+
+    def generate_prompt(self, history: List[tuple], question: str) -> str:
+        """
+        Generate a prompt asking the LLM to rewrite the follow-up as a standalone question.
+        """
+        conversation = "\n".join(f"User: {q}\nAssistant: {a}" for q, a in history)
+        prompt = f"""
+        You rewrite follow-up questions so they can be understood without the conversation.
+
+        **Instructions:**
+        - Rewrite the follow-up question as a single standalone question, resolving references to
+          earlier turns (pronouns, "what about ...", omitted subjects).
+        - Keep the user's intent and wording where possible; do not answer the question.
+        - If the question is already standalone, return it unchanged.
+
+        **Conversation:**
+        {conversation}
+
+        **Follow-up question:** {question}
+
+        **Respond ONLY with the standalone question.**
+        """
+        return prompt
+
+    def condense(self, history: List[tuple], question: str) -> str:
+        """
+        Return a standalone version of `question` given `history`, a list of (question, answer) pairs.
+
+        Falls back to the original question if the LLM call fails or returns nothing.
+        """
+        if not history or not self.is_follow_up(question):
+            return question
+
+        prompt = self.generate_prompt(history, question)
+        try:
+            route = self.router.route("condense", question=question)
+            response = self.router.invoke("condense", route, prompt, temperature=0.0, max_completion_tokens=100)
+        except Exception as e:
+            logger.error(f"Error during model inference: {e}")
+            return question
+
+        standalone = (response.content or "").strip().strip('"')
+        log_payload("Condensed question", standalone)
+        return standalone or question
@@ -8,36 +8,37 @@ It uses an ensemble retriever to fetch document chunks and then leverages LLM fo
 
 This classification helps filter out irrelevant queries, ensuring that further processing is only performed on useful data.
 """
-from langchain_openai import ChatOpenAI
-from config.settings import settings
-import re
-import logging
-
-logger = logging.getLogger(__name__)
+from typing import List, Optional
+from .model_router import ModelRouter
+from utils.instrumentation import timed
+from utils.logging import logger, log_payload
 
 
 class RelevanceChecker:
-    def __init__(self):
-        # Initialize the WatsonX ModelInference
-        self.model = ChatOpenAI(
-            model="llama-3.3-70b-versatile",
-            base_url=settings.GROQ_BASE_URL,
-            api_key=settings.GROQ_API_KEY,
-        )
-
-    def check(self, question: str, retriever, k=3) -> str:
+    def __init__(self, model=None, router: Optional[ModelRouter] = None):
+        # Route each call between the small and large LLM (a single preconfigured chat model
+        # can be passed in instead, e.g. for benchmarks)
+        self.router = router or (ModelRouter.fixed(model) if model is not None else ModelRouter())
+
+    def check(self, question: str, retriever, k=3, documents: Optional[List] = None) -> str:
         """
-        1. Retrieve the top-k document chunks from the global retriever.
+        1. Retrieve the top-k document chunks from the global retriever
+           (or use `documents`, when the caller has already retrieved them).
         2. Combine them into a single text string.
         3. Pass that text + question to the LLM for classification.
 
         Returns: "CAN_ANSWER", "PARTIAL", or "NO_MATCH".
         """
 
-        logger.debug(f"RelevanceChecker.check called with question='{question}' and k={k}")
+        logger.debug("RelevanceChecker.check called with question='{}' and k={}", question, k)
 
         # Retrieve doc chunks from the ensemble retriever
-        top_docs = retriever.invoke(question)
+        if documents is not None:
+            top_docs = documents
+        else:
+            with timed("retrieval", caller="relevance_checker") as fields:
+                top_docs = retriever.invoke(question)
+                fields["documents"] = len(top_docs)
         if not top_docs:
             logger.debug("No documents returned from retriever.invoke(). Classifying as NO_MATCH.")
             return "NO_MATCH"
@@ -69,7 +70,8 @@ class RelevanceChecker:
 
         # Call the LLM
         try:
-            response = self.model.invoke(prompt)
+            route = self.router.route("relevance", question=question, context=document_content)
+            response = self.router.invoke("relevance", route, prompt)
         except Exception as e:
             logger.error(f"Error during model inference: {e}")
             return "NO_MATCH"
@@ -77,20 +79,18 @@ class RelevanceChecker:
         # Extract the content from the response
         try:
             llm_response = response.content.strip().upper()
-            logger.debug(f"LLM response: {llm_response}")
+            log_payload("LLM response", llm_response)
         except (IndexError, KeyError) as e:
             logger.error(f"Unexpected response structure: {e}")
             return "NO_MATCH"
 
-        print(f"Checker response: {llm_response}")
-
         # Validate the response
         valid_labels = {"CAN_ANSWER", "PARTIAL", "NO_MATCH"}
         if llm_response not in valid_labels:
             logger.debug("LLM did not respond with a valid label. Forcing 'NO_MATCH'.")
             classification = "NO_MATCH"
         else:
-            logger.debug(f"Classification recognized as '{llm_response}'.")
+            logger.debug("Classification recognized as '{}'.", llm_response)
             classification = llm_response
 
         return classification
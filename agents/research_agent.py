@@ -1,27 +1,23 @@
-from langchain_openai import ChatOpenAI
-from typing import Dict, List
+from typing import Dict, List, Optional
 from langchain.schema import Document
-from config.settings import settings
+from .model_router import ModelRouter
+from utils.logging import logger, log_payload
 import json
 
 
 class ResearchAgent:
-    def __init__(self):
+    def __init__(self, model=None, router: Optional[ModelRouter] = None):
         """
-        Initialize the research agent with the LLM.
+        Initialize the research agent with a router over the small and large LLMs.
+
+        A single preconfigured chat model can be passed in instead (e.g. a fake for offline benchmarks).
         """
         # Initialize the LLM
-        print("Initializing ResearchAgent with Model...")
+        logger.info("Initializing ResearchAgent with Model...")
 
-        self.model = ChatOpenAI(
-            model="llama-3.3-70b-versatile",
-            base_url=settings.GROQ_BASE_URL,
-            api_key=settings.GROQ_API_KEY,
-            max_completion_tokens=300,
-            temperature=0.3,
-        )
+        self.router = router or (ModelRouter.fixed(model) if model is not None else ModelRouter())
 
-        print("Model initialized successfully.")
+        logger.info("Model initialized successfully.")
 
     def sanitize_response(self, response_text: str) -> str:
         """
@@ -49,43 +45,55 @@ class ResearchAgent:
         """
         return prompt
 
-    def generate(self, question: str, documents: List[Document]) -> Dict:
+    def generate(self, question: str, documents: List[Document], relevance: Optional[str] = None,
+                 previous_verification=None, previous_route: Optional[str] = None) -> Dict:
         """
         Generate an initial answer using the provided documents.
+
+        The relevance label and the previous round's verification result and route feed model routing.
         """
-        print(f"ResearchAgent.generate called with question='{question}' and {len(documents)} documents.")
+        logger.debug("ResearchAgent.generate called with question='{}' and {} documents.", question, len(documents))
 
         # Combine the top document contents into one string
         context = "\n\n".join([doc.page_content for doc in documents])
-        print(f"Combined context length: {len(context)} characters.")
+        logger.debug("Combined context length: {} characters.", len(context))
 
         # Create a prompt for the LLM
         prompt = self.generate_prompt(question, context)
-        print("Prompt created for the LLM.")
+        log_payload("Prompt created for the LLM", prompt)
 
         # Call the LLM to generate the answer
         try:
-            print("Sending prompt to the model...")
-            response = self.model.invoke(prompt)
-            print("LLM response received.")
+            route = self.router.route(
+                "research",
+                question=question,
+                context=context,
+                relevance=relevance,
+                previous_verification=previous_verification,
+                previous_route=previous_route,
+            )
+            logger.debug("Sending prompt to the model...")
+            response = self.router.invoke("research", route, prompt, max_completion_tokens=300, temperature=0.3)
+            logger.debug("LLM response received.")
         except Exception as e:
-            print(f"Error during model inference: {e}")
+            logger.error(f"Error during model inference: {e}")
             raise RuntimeError("Failed to generate answer due to a model error.") from e
 
         # Extract and process the LLM's response
         try:
             llm_response = response.content.strip()
-            print(f"Raw LLM response:\n{llm_response}")
+            log_payload("Raw LLM response", llm_response)
         except (IndexError, KeyError) as e:
-            print(f"Unexpected response structure: {e}")
+            logger.error(f"Unexpected response structure: {e}")
             llm_response = "I cannot answer this question based on the provided documents."
 
         # Sanitize the response
         draft_answer = self.sanitize_response(llm_response) if llm_response else "I cannot answer this question based on the provided documents."
 
-        print(f"Generated answer: {draft_answer}")
+        log_payload("Generated answer", draft_answer)
 
         return {
             "draft_answer": draft_answer,
+            "route": route,
             "context_used": context
         }
@@ -1,26 +1,49 @@
 import json  # Import for JSON serialization
-from langchain_openai import ChatOpenAI
-from typing import Dict, List
+from typing import Dict, List, Optional
 from langchain.schema import Document
+from pydantic import BaseModel, Field, ValidationError
 from config.settings import settings
+from .model_router import ModelRouter
+from utils.instrumentation import get_trace_id, metrics
+from utils.logging import logger, log_payload
+
+
+class VerificationResult(BaseModel):
+    """Typed verdict of the verification agent, carried in AgentState."""
+    supported: bool
+    unsupported_claims: List[str] = Field(default_factory=list)
+    contradictions: List[str] = Field(default_factory=list)
+    relevant: bool
+    additional_details: str = ""
+
+    @property
+    def passed(self) -> bool:
+        """True when the answer needs no further research."""
+        return self.supported and self.relevant
+
+
+# Shown to the model in place of the full JSON schema, which costs far more prompt tokens
+_RESPONSE_EXAMPLE = json.dumps({
+    "supported": True,
+    "unsupported_claims": ["claim", "..."],
+    "contradictions": ["contradiction", "..."],
+    "relevant": True,
+    "additional_details": "extra information or explanations",
+})
 
 
 class VerificationAgent:
-    def __init__(self):
+    def __init__(self, model=None, router: Optional[ModelRouter] = None):
         """
-        Initialize the verification agent with the LLM.
+        Initialize the verification agent with a router over the small and large LLMs.
+
+        A single preconfigured chat model can be passed in instead (e.g. a fake for offline benchmarks).
         """
         # Initialize the LLM
-        print("Initializing VerificationAgent with LLM...")
-        self.model = ChatOpenAI(
-            model="llama-3.1-8b-instant",
-            base_url=settings.GROQ_BASE_URL,
-            api_key=settings.GROQ_API_KEY,
-            temperature=0.0,
-            max_completion_tokens=200,
-        )
+        logger.info("Initializing VerificationAgent with LLM...")
+        self.router = router or (ModelRouter.fixed(model) if model is not None else ModelRouter())
            
-        print("ModelInference initialized successfully.")
+        logger.info("ModelInference initialized successfully.")
 
     def sanitize_response(self, response_text: str) -> str:
         """
@@ -38,173 +61,163 @@ class VerificationAgent:
         **Instructions:**
         - Verify the following answer against the provided context.
         - Check for:
-        1. Direct/indirect factual support (YES/NO)
+        1. Direct/indirect factual support (true/false)
         2. Unsupported claims (list any if present)
         3. Contradictions (list any if present)
-        4. Relevance to the question (YES/NO)
+        4. Relevance to the question (true/false)
         - Provide additional details or explanations where relevant.
-        - Respond in the exact format specified below without adding any unrelated information.
+        - Respond with a single JSON object in the format below, without adding any unrelated information.
 
         **Format:**
-        Supported: YES/NO
-        Unsupported Claims: [item1, item2, ...]
-        Contradictions: [item1, item2, ...]
-        Relevant: YES/NO
-        Additional Details: [Any extra information or explanations]
+        {_RESPONSE_EXAMPLE}
 
         **Answer:** {answer}
         **Context:**
         {context}
 
-        **Respond ONLY with the above format.**
+        **Respond ONLY with the JSON object.**
         """
         return prompt
 
-    def parse_verification_response(self, response_text: str) -> Dict:
+    def generate_repair_prompt(self, previous_response: str) -> str:
+        """
+        Generate a short prompt asking the LLM to restate a malformed reply as valid JSON.
+
+        The context is not repeated, so a re-ask costs a fraction of the original call.
         """
-        Parse the LLM's verification response into a structured dictionary.
+        prompt = f"""
+        Your previous verification reply could not be parsed:
+
+        {previous_response}
+
+        Restate the same verdict as a single JSON object in exactly this format:
+        {_RESPONSE_EXAMPLE}
+
+        **Respond ONLY with the JSON object.**
+        """
+        return prompt
+
+    def parse_verification_response(self, response_text: str) -> Optional[VerificationResult]:
+        """
+        Parse the LLM's JSON verification response into a VerificationResult.
+
+        Returns None if the response is not a JSON object matching the schema.
         """
+        # Tolerate code fences or stray text around the object
+        start, end = response_text.find("{"), response_text.rfind("}")
+        if start == -1 or end < start:
+            logger.warning("Verification response contains no JSON object.")
+            return None
         try:
-            lines = response_text.split('\n')
-            verification = {}
-            for line in lines:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip().capitalize()
-                    value = value.strip()
-                    if key in {"Supported", "Unsupported claims", "Contradictions", "Relevant", "Additional details"}:
-                        if key in {"Unsupported claims", "Contradictions"}:
-                            # Convert string list to actual list
-                            if value.startswith('[') and value.endswith(']'):
-                                items = value[1:-1].split(',')
-                                # Remove any surrounding quotes and whitespace
-                                items = [item.strip().strip('"').strip("'") for item in items if item.strip()]
-                                verification[key] = items
-                            else:
-                                verification[key] = []
-                        elif key == "Additional details":
-                            verification[key] = value
-                        else:
-                            verification[key] = value.upper()
-            # Ensure all keys are present
-            for key in ["Supported", "Unsupported Claims", "Contradictions", "Relevant", "Additional Details"]:
-                if key not in verification:
-                    if key in {"Unsupported Claims", "Contradictions"}:
-                        verification[key] = []
-                    elif key == "Additional Details":
-                        verification[key] = ""
-                    else:
-                        verification[key] = "NO"
-
-            return verification
-        except Exception as e:
-            print(f"Error parsing verification response: {e}")
+            return VerificationResult.model_validate_json(response_text[start:end + 1])
+        except ValidationError as e:
+            logger.warning(f"Verification response does not match the schema: {e.error_count()} error(s)")
             return None
 
-    def format_verification_report(self, verification: Dict) -> str:
+    def format_verification_report(self, verification: Optional[VerificationResult]) -> str:
         """
-        Format the verification report dictionary into a readable paragraph.
+        Format the verification result into a readable paragraph.
         """
-        supported = verification.get("Supported", "NO")
-        unsupported_claims = verification.get("Unsupported Claims", [])
-        contradictions = verification.get("Contradictions", [])
-        relevant = verification.get("Relevant", "NO")
-        additional_details = verification.get("Additional Details", "")
-
-        report = f"**Supported:** {supported}\n"
-        if unsupported_claims:
-            report += f"**Unsupported Claims:** {', '.join(unsupported_claims)}\n"
+        if verification is None:
+            return (
+                "**Supported:** UNKNOWN\n"
+                "**Additional Details:** The verification response could not be parsed, "
+                "so this answer has not been verified.\n"
+            )
+
+        report = f"**Supported:** {'YES' if verification.supported else 'NO'}\n"
+        if verification.unsupported_claims:
+            report += f"**Unsupported Claims:** {', '.join(verification.unsupported_claims)}\n"
         else:
             report += f"**Unsupported Claims:** None\n"
 
-        if contradictions:
-            report += f"**Contradictions:** {', '.join(contradictions)}\n"
+        if verification.contradictions:
+            report += f"**Contradictions:** {', '.join(verification.contradictions)}\n"
         else:
             report += f"**Contradictions:** None\n"
 
-        report += f"**Relevant:** {relevant}\n"
+        report += f"**Relevant:** {'YES' if verification.relevant else 'NO'}\n"
 
-        if additional_details:
-            report += f"**Additional Details:** {additional_details}\n"
+        if verification.additional_details:
+            report += f"**Additional Details:** {verification.additional_details}\n"
         else:
             report += f"**Additional Details:** None\n"
 
         return report
 
+    def _invoke(self, prompt: str, task: str, route: str) -> str:
+        """Send a prompt in JSON mode and return the sanitized reply text."""
+        try:
+            logger.debug("Sending prompt to the model...")
+            # JSON mode: the provider constrains the reply to a single JSON object
+            response = self.router.invoke(
+                task, route, prompt,
+                temperature=0.0,
+                max_completion_tokens=200,
+                response_format={"type": "json_object"},
+            )
+            logger.debug("LLM response received.")
+        except Exception as e:
+            logger.error(f"Error during model inference: {e}")
+            raise RuntimeError("Failed to verify answer due to a model error.") from e
+
+        llm_response = self.sanitize_response(response.content or "")
+        log_payload("Raw LLM response", llm_response)
+        return llm_response
+
     def check(self, answer: str, documents: List[Document]) -> Dict:
         """
         Verify the answer against the provided documents.
+
+        A reply that doesn't parse is re-asked (verifier only, without the context) up to
+        settings.VERIFICATION_MAX_RETRIES times. Returns the formatted report and the
+        VerificationResult, which is None if no attempt produced a valid one.
         """
-        print(f"VerificationAgent.check called with answer='{answer}' and {len(documents)} documents.")
+        logger.debug("VerificationAgent.check called with {} documents.", len(documents))
+        log_payload("Answer to verify", answer)
 
         # Combine all document contents into one string without truncation
         context = "\n\n".join([doc.page_content for doc in documents])
-        print(f"Combined context length: {len(context)} characters.")
+        logger.debug("Combined context length: {} characters.", len(context))
 
         # Create a prompt for the LLM to verify the answer
         prompt = self.generate_prompt(answer, context)
-        print("Prompt created for the LLM.")
-
-        # Call the LLM to generate the verification report
-        try:
-            print("Sending prompt to the model...")
-            response = self.model.invoke(prompt)
-            print("LLM response received.")
-        except Exception as e:
-            print(f"Error during model inference: {e}")
-            raise RuntimeError("Failed to verify answer due to a model error.") from e
-
-        # Extract and process the LLM's response
-        try:
-            llm_response = response.content.strip()
-            print(f"Raw LLM response:\n{llm_response}")
-        except (IndexError, KeyError) as e:
-            print(f"Unexpected response structure: {e}")
-            verification_report = {
-                "Supported": "NO",
-                "Unsupported Claims": [],
-                "Contradictions": [],
-                "Relevant": "NO",
-                "Additional Details": "Invalid response structure from the model."
-            }
-            verification_report_formatted = self.format_verification_report(verification_report)
-            print(f"Verification report:\n{verification_report_formatted}")
-            print(f"Context used: {context}")
-            return {
-                "verification_report": verification_report_formatted,
-                "context_used": context
-            }
-
-        # Sanitize the response
-        sanitized_response = self.sanitize_response(llm_response) if llm_response else ""
-        if not sanitized_response:
-            print("LLM returned an empty response.")
-            verification_report = {
-                "Supported": "NO",
-                "Unsupported Claims": [],
-                "Contradictions": [],
-                "Relevant": "NO",
-                "Additional Details": "Empty response from the model."
-            }
-        else:
-            # Parse the response into the expected format
-            verification_report = self.parse_verification_response(sanitized_response)
-            if verification_report is None:
-                print("LLM did not respond with the expected format. Using default verification report.")
-                verification_report = {
-                    "Supported": "NO",
-                    "Unsupported Claims": [],
-                    "Contradictions": [],
-                    "Relevant": "NO",
-                    "Additional Details": "Failed to parse the model's response."
-                }
+        logger.debug("Prompt created for the LLM.")
+
+        route = self.router.route("verification", context=context)
+        verification = None
+        llm_response = ""
+        for attempt in range(settings.VERIFICATION_MAX_RETRIES + 1):
+            if attempt == 0:
+                llm_response = self._invoke(prompt, "verification", route)
+            else:
+                # An empty reply has nothing to repair, so ask the full question again
+                retry_prompt = self.generate_repair_prompt(llm_response) if llm_response else prompt
+                llm_response = self._invoke(retry_prompt, "verification_retry", route)
+
+            verification = self.parse_verification_response(llm_response)
+            if verification is not None:
+                break
+            metrics.observe("verification.parse_failures", 1)
+            logger.warning(f"Unparseable verification response (attempt {attempt + 1}).")
+
+        if attempt > 0 and (verification is None or verification.passed):
+            # The free-text parser defaulted missing fields to NO, which sent these cases
+            # back through a full research + verification round
+            metrics.observe("verification.re_research_avoided", 1)
+            logger.bind(
+                metric="re_research_avoided",
+                trace_id=get_trace_id(),
+                recovered=verification is not None,
+            ).info("Re-research loop avoided after a malformed verification response")
 
         # Format the verification report into a paragraph
-        verification_report_formatted = self.format_verification_report(verification_report)
-        print(f"Verification report:\n{verification_report_formatted}")
-        print(f"Context used: {context}")
+        verification_report_formatted = self.format_verification_report(verification)
+        log_payload("Verification report", verification_report_formatted)
+        log_payload("Context used", context)
 
         return {
             "verification_report": verification_report_formatted,
+            "verification": verification,
             "context_used": context
         }
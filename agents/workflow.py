@@ -1,27 +1,49 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict
+from typing import TypedDict, List, Dict, Optional
 from .research_agent import ResearchAgent
-from .verification_agent import VerificationAgent
+from .verification_agent import VerificationAgent, VerificationResult
 from .relevance_checker import RelevanceChecker
+from .model_router import ModelRouter
+from .query_condenser import QueryCondenser
+from .conversation import ConversationSession
 from langchain.schema import Document
 from langchain.retrievers import EnsembleRetriever
-import logging
-
-logger = logging.getLogger(__name__)
+from config.settings import settings
+from retriever.reranker import Reranker
+from utils.instrumentation import get_trace_id, instrument_node, llm_usage_scope, metrics, timed, trace
+from utils.profiling import profile
+from utils.tokens import count_tokens
+from utils.logging import logger, log_payload
 
 class AgentState(TypedDict):
     question: str
-    documents: List[Document]
+    documents: List[Document]  # Context of the research and verification prompts (reranked, if enabled)
+    candidates: List[Document]  # Everything retrieved, for the relevance check
     draft_answer: str
     verification_report: str
+    verification: Optional[VerificationResult]
     is_relevant: bool
+    relevance_label: str
+    reuse_relevance: bool
+    research_rounds: int
+    research_route: Optional[str]
     retriever: EnsembleRetriever
+    trace_id: str
 
 class AgentWorkflow:
-    def __init__(self):
-        self.researcher = ResearchAgent()
-        self.verifier = VerificationAgent()
-        self.relevance_checker = RelevanceChecker()
+    def __init__(self, researcher: Optional[ResearchAgent] = None,
+                 verifier: Optional[VerificationAgent] = None,
+                 relevance_checker: Optional[RelevanceChecker] = None,
+                 router: Optional[ModelRouter] = None,
+                 condenser: Optional[QueryCondenser] = None,
+                 reranker: Optional[Reranker] = None):
+        if router is None and not (researcher and verifier and relevance_checker):
+            router = ModelRouter()  # One set of model clients shared by the default agents
+        self.researcher = researcher or ResearchAgent(router=router)
+        self.verifier = verifier or VerificationAgent(router=router)
+        self.relevance_checker = relevance_checker or RelevanceChecker(router=router)
+        self.condenser = condenser or QueryCondenser(router=router or self.researcher.router)
+        self.reranker = reranker or (Reranker() if settings.RERANK_ENABLED else None)
         self.compiled_workflow = self.build_workflow()  # Compile once during initialization
         
     def build_workflow(self):
@@ -54,79 +76,195 @@ class AgentWorkflow:
         )
         return workflow.compile()
     
+    def new_session(self, max_turns: Optional[int] = None) -> ConversationSession:
+        """Conversation state to pass to full_pipeline() for follow-up questions."""
+        return ConversationSession(max_turns)
+
+    @instrument_node("check_relevance")
     def _check_relevance_step(self, state: AgentState) -> Dict:
+        if state["reuse_relevance"]:
+            # A condensed follow-up over mostly the same chunks: keep the previous turn's label
+            logger.info("Reusing relevance label '{}' from the previous turn", state["relevance_label"])
+            return {"is_relevant": True}
+
         retriever = state["retriever"]
         classification = self.relevance_checker.check(
             question=state["question"], 
             retriever=retriever, 
-            k=20
+            k=20,
+            documents=state["candidates"]  # Already retrieved for this question by full_pipeline
         )
 
         if classification == "CAN_ANSWER":
             # We have enough info to proceed
-            return {"is_relevant": True}
+            return {"is_relevant": True, "relevance_label": classification}
 
         elif classification == "PARTIAL":
             # There's partial coverage, but we can still proceed
             return {
-                "is_relevant": True
+                "is_relevant": True,
+                "relevance_label": classification
             }
 
         else:  # classification == "NO_MATCH"
             return {
                 "is_relevant": False,
+                "relevance_label": classification,
                 "draft_answer": "This question isn't related (or there's no data) for your query. Please ask another question relevant to the uploaded document(s)."
             }
 
 
     def _decide_after_relevance_check(self, state: AgentState) -> str:
         decision = "relevant" if state["is_relevant"] else "irrelevant"
-        print(f"[DEBUG] _decide_after_relevance_check -> {decision}")
+        logger.debug("_decide_after_relevance_check -> {}", decision)
         return decision
     
-    def full_pipeline(self, question: str, retriever: EnsembleRetriever):
-        try:
-            print(f"[DEBUG] Starting full_pipeline with question='{question}'")
-            documents = retriever.invoke(question)
-            logger.info(f"Retrieved {len(documents)} relevant documents (from .invoke)")
-
-            initial_state = AgentState(
-                question=question,
-                documents=documents,
-                draft_answer="",
-                verification_report="",
-                is_relevant=False,
-                retriever=retriever
-            )
-            
-            final_state = self.compiled_workflow.invoke(initial_state)
-            
-            return {
-                "draft_answer": final_state["draft_answer"],
-                "verification_report": final_state["verification_report"]
-            }
-        except Exception as e:
-            logger.error(f"Workflow execution failed: {e}")
-            raise
-    
+    def full_pipeline(self, question: str, retriever: EnsembleRetriever, trace_id: Optional[str] = None,
+                      session: Optional[ConversationSession] = None):
+        """
+        Answer a question over the retriever's documents.
+
+        With a `session` (see new_session()), follow-ups are condensed into standalone questions
+        using the previous turns, and the relevance check of a condensed follow-up is skipped when
+        few of its retrieved chunks are new to the conversation.
+
+        Retrieval and the research/verification prompts still cover all chunks every turn: the
+        standalone question needs its own search, and the LLM calls are stateless, so chunks from
+        earlier turns can't be left out of the prompts. Per-turn metrics count the chunks already
+        seen and the relevance prompt tokens saved.
+        """
+        with trace(trace_id) as trace_id:
+            try:
+                logger.debug("Starting full_pipeline with question='{}'", question)
+                with profile("full_pipeline"), timed("pipeline.total"), llm_usage_scope() as usage:
+                    standalone_question = question
+                    if session is not None:
+                        session.bind(retriever)
+                        with timed("condense"):
+                            standalone_question = self.condenser.condense(session.history(), question)
+
+                    with timed("retrieval", caller="full_pipeline") as fields:
+                        documents = retriever.invoke(standalone_question)
+                        fields["documents"] = len(documents)
+                    logger.info("Retrieved {} relevant documents (from .invoke)", len(documents))
+
+                    # The relevance check sees every retrieved chunk; research and verification only the best ones
+                    candidates = documents
+                    if self.reranker is not None:
+                        documents = self.reranker.rerank(standalone_question, documents)
+
+                    seen, reuse_relevance = 0, False
+                    if session is not None:
+                        seen = session.seen(documents)
+                        new_share = (len(documents) - seen) / len(documents) if documents else 1.0
+                        # Only a question that refers back to the last turn and was rewritten inherits its
+                        # label; unrelated questions over a small document set also get mostly the same chunks
+                        follow_up = (self.condenser.refers_back(question)
+                                     and self.condenser.was_condensed(question, standalone_question))
+                        reuse_relevance = (follow_up
+                                           and session.last_relevance_label in ("CAN_ANSWER", "PARTIAL")
+                                           and new_share <= settings.SESSION_REUSE_RELEVANCE_MAX_NEW)
+
+                    initial_state = AgentState(
+                        question=standalone_question,
+                        documents=documents,
+                        candidates=candidates,
+                        draft_answer="",
+                        verification_report="",
+                        verification=None,
+                        is_relevant=False,
+                        relevance_label=session.last_relevance_label if reuse_relevance else "",
+                        reuse_relevance=reuse_relevance,
+                        research_rounds=0,
+                        research_route=None,
+                        retriever=retriever,
+                        trace_id=trace_id
+                    )
+
+                    final_state = self.compiled_workflow.invoke(initial_state)
+
+                if session is not None:
+                    self._record_turn(session, final_state, question, seen, usage)
+                    session.add_turn(question, standalone_question, final_state["draft_answer"],
+                                     documents, final_state["relevance_label"])
+
+                return {
+                    "draft_answer": final_state["draft_answer"],
+                    "verification_report": final_state["verification_report"],
+                    "verification": final_state.get("verification"),
+                    "standalone_question": standalone_question,
+                    "trace_id": trace_id
+                }
+            except Exception as e:
+                logger.error(f"Workflow execution failed: {e}")
+                raise
+
+    def _record_turn(self, session: ConversationSession, state: AgentState, question: str,
+                     seen: int, usage: Dict) -> None:
+        """Per-turn metrics: chunks already seen in the conversation and the LLM tokens the turn used (or avoided)."""
+        documents = state["documents"]
+        # Roughly the passages of the relevance prompt that was not sent
+        tokens_saved = count_tokens("\n\n".join(d.page_content for d in state["candidates"][:20])) \
+            if state["reuse_relevance"] else 0
+        turn = {
+            "turn": session.turn_count + 1,
+            "condensed": self.condenser.was_condensed(question, state["question"]),
+            "chunks_new": len(documents) - seen,
+            "chunks_seen": seen,
+            "relevance_skipped": state["reuse_relevance"],
+            "llm_calls": usage["calls"],
+            "prompt_tokens": usage["prompt_tokens"],
+            "prompt_tokens_saved": tokens_saved,
+        }
+        metrics.observe("session.turn.chunks_seen", seen)
+        metrics.observe("session.turn.chunks_new", turn["chunks_new"])
+        metrics.observe("session.turn.prompt_tokens", usage["prompt_tokens"])
+        metrics.observe("session.turn.prompt_tokens_saved", tokens_saved)
+        logger.bind(metric="turn", trace_id=get_trace_id(), **turn).info(
+            f"Turn {turn['turn']}: {seen}/{len(documents)} chunks already seen, "
+            f"{usage['prompt_tokens']} prompt tokens ({tokens_saved} saved)"
+        )
+
+    @instrument_node("research")
     def _research_step(self, state: AgentState) -> Dict:
-        print(f"[DEBUG] Entered _research_step with question='{state['question']}'")
-        result = self.researcher.generate(state["question"], state["documents"])
-        print("[DEBUG] Researcher returned draft answer.")
-        return {"draft_answer": result["draft_answer"]}
+        logger.debug("Entered _research_step with question='{}'", state["question"])
+        result = self.researcher.generate(
+            state["question"],
+            state["documents"],
+            relevance=state["relevance_label"],
+            previous_verification=state["verification"],
+            previous_route=state["research_route"]
+        )
+        logger.debug("Researcher returned draft answer.")
+        return {
+            "draft_answer": result["draft_answer"],
+            "research_route": result["route"],
+            "research_rounds": state["research_rounds"] + 1
+        }
     
+    @instrument_node("verify")
     def _verification_step(self, state: AgentState) -> Dict:
-        print("[DEBUG] Entered _verification_step. Verifying the draft answer...")
+        logger.debug("Entered _verification_step. Verifying the draft answer...")
         result = self.verifier.check(state["draft_answer"], state["documents"])
-        print("[DEBUG] VerificationAgent returned a verification report.")
-        return {"verification_report": result["verification_report"]}
+        logger.debug("VerificationAgent returned a verification report.")
+        return {
+            "verification_report": result["verification_report"],
+            "verification": result["verification"]
+        }
     
     def _decide_next_step(self, state: AgentState) -> str:
-        verification_report = state["verification_report"]
-        print(f"[DEBUG] _decide_next_step with verification_report='{verification_report}'")
-        if "Supported: NO" in verification_report or "Relevant: NO" in verification_report:
-            logger.info("[DEBUG] Verification indicates re-research needed.")
+        verification = state["verification"]
+        log_payload("_decide_next_step with verification_report", state["verification_report"])
+        if verification is None:
+            # Re-researching would not make the verifier's output parseable; return the answer unverified
+            logger.warning("Verification unavailable, ending workflow without re-research.")
+            return "end"
+        if not verification.passed:
+            if state["research_rounds"] >= settings.MAX_RESEARCH_ROUNDS:
+                logger.warning("Verification failed after {} research rounds, ending workflow.", state["research_rounds"])
+                return "end"
+            logger.info("Verification indicates re-research needed.")
             return "re_research"
         else:
-            logger.info("[DEBUG] Verification successful, ending workflow.")
+            logger.info("Verification successful, ending workflow.")
             return "end"
@@ -1,13 +1,19 @@
-import gradio as gr
+import time
+_PROCESS_START = time.perf_counter()
+
 import hashlib
 from typing import List, Dict
 import os
 
-from document_processor.file_handler import DocumentProcessor
-from retriever.builder import RetrieverBuilder
-from agents.workflow import AgentWorkflow
-from config import constants, settings
+# Only lightweight modules are imported here; Gradio is imported in main() and
+# Docling/Chroma/LangChain/LangGraph inside the LazyResource factories below.
+from config import constants
+from config.settings import settings
 from utils.logging import logger
+from utils.instrumentation import metrics, new_trace_id, timed, trace
+from utils.lazy import LazyResource, prewarm
+from utils.profiling import profile_request
+from document_processor.ingestion import IngestionCancelled, IngestionManager
 
 # 1) Define some example data 
 #    (i.e. question + paths to documents relevant to that question).
@@ -22,10 +28,44 @@ EXAMPLES = {
     }
 }
 
+def _make_processor():
+    from document_processor.file_handler import DocumentProcessor
+    return DocumentProcessor()
+
+def _make_retriever_builder():
+    from retriever.builder import RetrieverBuilder
+    return RetrieverBuilder()
+
+def _make_bundles(retriever_builder: LazyResource):
+    from retriever.bundle import BundleRegistry
+    if not settings.BUNDLE_DIR or not os.path.isdir(settings.BUNDLE_DIR):
+        return BundleRegistry()
+    return BundleRegistry.load_dir(settings.BUNDLE_DIR, retriever_builder.get().embeddings)
+
+def _make_workflow():
+    from agents.workflow import AgentWorkflow
+    return AgentWorkflow()
+
 def main():
-    processor = DocumentProcessor()
-    retriever_builder = RetrieverBuilder()
-    workflow = AgentWorkflow()
+    with timed("startup.import_gradio"):
+        import gradio as gr
+
+    # Heavy components are built on first use (or prewarmed once the UI is up)
+    processor = LazyResource("document_processor", _make_processor, warmup=lambda p: p.warmup())
+    retriever_builder = LazyResource("retriever_builder", _make_retriever_builder, warmup=lambda b: b.warmup())
+    workflow = LazyResource("agent_workflow", _make_workflow)
+    # Prebuilt index bundles for known documents (e.g. the examples), loaded first when prewarming
+    bundles = LazyResource("bundles", lambda: _make_bundles(retriever_builder))
+    resources = [bundles, processor, retriever_builder, workflow]
+
+    if not settings.LAZY_STARTUP:
+        for resource in resources:
+            resource.get()
+
+    # Uploads are ingested in the background as soon as they change, unless a bundle covers them
+    ingestion = IngestionManager(
+        processor.get, retriever_builder.get, get_prebuilt=lambda file_hashes: bundles.get().get(file_hashes)
+    )
 
     # Define custom CSS for styling
     css = """
@@ -81,6 +121,7 @@ def main():
     }
     """
 
+    ui_start = time.perf_counter()
     with gr.Blocks(theme=gr.themes.Citrus(), title="DocChat 🐥", css=css, js=js) as demo:
         gr.Markdown("## DocChat: powered by Docling 🐥 and LangGraph", elem_classes="subtitle")
         gr.Markdown("# How it works ✨:", elem_classes="title")
@@ -91,7 +132,8 @@ def main():
         # 2) Maintain the session state for retrieving doc changes
         session_state = gr.State({
             "file_hashes": frozenset(),
-            "retriever": None
+            "retriever": None,
+            "conversation": None  # Earlier turns, for follow-up questions
         })
 
         # 3) Layout 
@@ -108,6 +150,7 @@ def main():
 
                 # Standard input components
                 files = gr.Files(label="📄 Upload Documents", file_types=constants.ALLOWED_TYPES)
+                ingest_status = gr.Markdown()
                 question = gr.Textbox(label="❓ Question", lines=3)
 
                 submit_btn = gr.Button("Submit 🚀")
@@ -149,45 +192,119 @@ def main():
             outputs=[files, question]
         )
 
-        # 5) Standard flow for question submission
-        def process_question(question_text: str, uploaded_files: List, state: Dict):
-            """Handle questions with document caching."""
+        # 5) Start ingesting documents as soon as they are uploaded (or loaded from an example)
+        def start_ingestion(uploaded_files: List, request: gr.Request):
+            """Submit the uploaded files for background ingestion and stream its progress."""
+            session_id = request.session_hash
+            if not uploaded_files:
+                ingestion.discard(session_id)
+                yield ""
+                return
+            try:
+                # The job runs in a copy of this context, so a profiling request carries over to it
+                with profile_request(_profiling_requested(request)):
+                    job = ingestion.submit(session_id, uploaded_files, _get_file_hashes(uploaded_files))
+            except Exception as e:
+                logger.error(f"Failed to start ingestion: {str(e)}")
+                yield f"❌ Error: {str(e)}"
+                return
+
+            # Stop reporting once a newer upload has replaced this job
+            while not job.done and ingestion.get(session_id) is job:
+                yield job.describe()
+                time.sleep(0.5)
+            if ingestion.get(session_id) is job:
+                yield job.describe()
+
+        # The handler mostly sleeps while polling, so it must not hold up other sessions' uploads
+        files.change(
+            fn=start_ingestion,
+            inputs=[files],
+            outputs=[ingest_status],
+            concurrency_limit=None
+        )
+
+        def end_session(request: gr.Request):
+            """Cancel the session's ingestion when its browser tab closes."""
+            ingestion.discard(request.session_hash)
+
+        demo.unload(end_session)
+
+        # 6) Standard flow for question submission
+        def process_question(question_text: str, uploaded_files: List, state: Dict, request: gr.Request):
+            """Handle questions, reusing (or waiting for) the session's background ingestion."""
+            trace_id = new_trace_id()
+            profiling = _profiling_requested(request)
             try:
                 if not question_text.strip():
                     raise ValueError("❌ Question cannot be empty")
                 if not uploaded_files:
                     raise ValueError("❌ No documents uploaded")
 
-                current_hashes = _get_file_hashes(uploaded_files)
-                
-                if state["retriever"] is None or current_hashes != state["file_hashes"]:
-                    logger.info("Processing new/changed documents...")
-                    chunks = processor.process(uploaded_files)
-                    retriever = retriever_builder.build_hybrid_retriever(chunks)
-                    
-                    state.update({
-                        "file_hashes": current_hashes,
-                        "retriever": retriever
-                    })
-                
-                result = workflow.full_pipeline(
-                    question=question_text,
-                    retriever=state["retriever"]
-                )
+                with trace(trace_id), profile_request(profiling):
+                    current_hashes = _get_file_hashes(uploaded_files)
+
+                    if state["retriever"] is None or current_hashes != state["file_hashes"]:
+                        # Joins the in-flight job for these files, or starts one if none exists
+                        logger.info("Waiting for document ingestion...")
+                        job = ingestion.submit(request.session_hash, uploaded_files, current_hashes)
+                        retriever = job.wait()
+
+                        state.update({
+                            "file_hashes": current_hashes,
+                            "retriever": retriever
+                        })
+
+                if state.get("conversation") is None:
+                    state["conversation"] = workflow.get().new_session()
+
+                with profile_request(profiling):
+                    result = workflow.get().full_pipeline(
+                        question=question_text,
+                        retriever=state["retriever"],
+                        trace_id=trace_id,
+                        session=state["conversation"]
+                    )
                 
                 return result["draft_answer"], result["verification_report"], state
                     
+            except IngestionCancelled:
+                return "❌ Error: The documents changed while they were being processed. Please submit again.", "", state
             except Exception as e:
-                logger.error(f"Processing error: {str(e)}")
+                logger.error(f"Processing error [trace_id={trace_id}]: {str(e)}")
                 return f"❌ Error: {str(e)}", "", state
 
         submit_btn.click(
             fn=process_question,
             inputs=[question, files, session_state],
-            outputs=[answer_output, verification_output, session_state]
+            outputs=[answer_output, verification_output, session_state],
+            concurrency_limit=settings.GRADIO_CONCURRENCY_LIMIT
         )
 
-    demo.launch(server_name="127.0.0.1", server_port=5000, share=True)
+    # Shared components (processor, retriever builder, workflow, ingestion pool) are thread-safe
+    demo.queue(default_concurrency_limit=settings.GRADIO_CONCURRENCY_LIMIT, max_size=settings.GRADIO_MAX_QUEUE_SIZE)
+
+    metrics.observe("startup.build_ui.duration_ms", (time.perf_counter() - ui_start) * 1000)
+
+    demo.launch(server_name="127.0.0.1", server_port=5000, share=True, prevent_thread_lock=True,
+                max_threads=settings.GRADIO_MAX_THREADS)
+    _log_startup_breakdown()
+
+    if settings.LAZY_STARTUP and settings.PREWARM:
+        prewarm(resources)
+
+    demo.block_thread()
+
+def _log_startup_breakdown():
+    """Log how long each startup phase took and the total time until the UI was serving."""
+    breakdown = {
+        name.removesuffix(".duration_ms"): round(summary["sum"], 1)
+        for name, summary in metrics.snapshot().items()
+        if name.startswith("startup.") and name.endswith(".duration_ms")
+    }
+    breakdown["time_to_first_page"] = round((time.perf_counter() - _PROCESS_START) * 1000, 1)
+    metrics.observe("startup.time_to_first_page.duration_ms", breakdown["time_to_first_page"])
+    logger.info(f"Startup breakdown (ms): {breakdown}")
 
 def _get_file_hashes(uploaded_files: List) -> frozenset:
     """Generate SHA-256 hashes for uploaded files."""
@@ -197,5 +314,10 @@ def _get_file_hashes(uploaded_files: List) -> frozenset:
             hashes.add(hashlib.sha256(f.read()).hexdigest())
     return frozenset(hashes)
 
+def _profiling_requested(request) -> bool:
+    """Whether the client asked for this Gradio request to be profiled (see utils/profiling.py)."""
+    value = request.headers.get(settings.PROFILING_HEADER, "") if request is not None else ""
+    return value.strip().lower() in ("1", "true", "yes")
+
 if __name__ == "__main__":
     main()
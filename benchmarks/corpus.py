@@ -0,0 +1,54 @@
+"""
+Synthetic Markdown corpora for benchmarking.
+
+Each document is a set of `#`/`##` sections filled with seeded pseudo-random prose,
+with one planted fact per section so generated questions have a known answer.
+"""
+
+import random
+from pathlib import Path
+from typing import Dict, List
+
+_VOCAB = (
+    "energy data center efficiency carbon report model training inference latency "
+    "throughput region facility cooling water renewable grid emission target policy "
+    "benchmark accuracy dataset evaluation reasoning coding math language system "
+    "network storage capacity growth annual quarterly baseline improvement measure"
+).split()
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_VOCAB) for _ in range(words))
+    return text.capitalize() + "."
+
+
+def generate_corpus(out_dir: str, docs: int = 5, sections: int = 20,
+                    paragraphs: int = 3, words: int = 80, seed: int = 0) -> Dict[str, List[str]]:
+    """
+    Write `docs` Markdown files into `out_dir`.
+
+    Returns a dict with the generated `file_paths` and `questions` (one per planted fact,
+    capped at 50).
+    """
+    rng = random.Random(seed)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    file_paths, questions = [], []
+    for d in range(docs):
+        lines = [f"# Synthetic Report {d}"]
+        for s in range(sections):
+            code = f"facility-{d}-{s}"
+            value = rng.randint(100, 999)
+            lines.append(f"\n## Section {s}: {rng.choice(_VOCAB)} {rng.choice(_VOCAB)}\n")
+            for _ in range(paragraphs):
+                lines.append(_paragraph(rng, words) + "\n")
+            lines.append(f"The measured efficiency of {code} was {value} units.\n")
+            if len(questions) < 50:
+                questions.append(f"What was the measured efficiency of {code}?")
+
+        path = out / f"synthetic_{d}.md"
+        path.write_text("\n".join(lines), encoding="utf-8")
+        file_paths.append(str(path))
+
+    return {"file_paths": file_paths, "questions": questions}
@@ -0,0 +1,148 @@
+"""
+Deterministic offline stand-ins for the remote model backends. Key features include:
+
+1. FakeEmbeddings: hashed bag-of-words vectors, so lexical overlap yields meaningful similarity
+2. FakeChatModel: answers the relevance, research and verification prompts with well-formed replies
+3. FakeCrossEncoder: scores (query, passage) pairs by query term coverage, like a reranker
+4. All of them can simulate latency, and the chat model reports plausible token usage,
+   so instrumentation stays meaningful
+"""
+
+import hashlib
+import itertools
+import json
+import math
+import re
+import time
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=100_000)
+def _bucket(token: str, dim: int) -> int:
+    """Map a token to a stable vector index (independent of PYTHONHASHSEED)."""
+    return int.from_bytes(hashlib.md5(token.encode()).digest()[:4], "little") % dim
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words embeddings, L2-normalized."""
+
+    def __init__(self, dim: int = 384, latency_s: float = 0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN_RE.findall(text.lower()):
+            vector[_bucket(token, self.dim)] += 1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self._embed(text)
+
+
+class FakeCrossEncoder:
+    """CrossEncoder stand-in: the share of query terms found in the passage, with a length tie-breaker."""
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s  # Simulated time per batch
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32) -> np.ndarray:
+        if self.latency_s:
+            time.sleep(self.latency_s * math.ceil(len(pairs) / batch_size))
+        scores = []
+        for query, passage in pairs:
+            query_terms = set(_TOKEN_RE.findall(query.lower()))
+            passage_terms = _TOKEN_RE.findall(passage.lower())
+            coverage = len(query_terms & set(passage_terms)) / (len(query_terms) or 1)
+            scores.append(coverage - 1e-6 * len(passage_terms))
+        return np.asarray(scores, dtype=np.float32)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that recognizes DocChat's prompts and replies deterministically.
+
+    * Relevance prompts get "CAN_ANSWER"
+    * Verification prompts (and re-asks) get a fully supported JSON report; with
+      `malformed_verification_every=n`, every n-th first attempt is free text instead
+    * Anything else gets an extractive answer built from the start of the context
+    """
+
+    model_name: str = "fake-chat"
+    latency_s: float = 0.0
+    answer_words: int = 40
+    malformed_verification_every: int = 0
+    _verifications = PrivateAttr(default_factory=itertools.count)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, prompt: str) -> str:
+        if "relevance checker" in prompt:
+            return "CAN_ANSWER"
+        if "verify the accuracy" in prompt:
+            n = next(self._verifications) + 1
+            if self.malformed_verification_every and n % self.malformed_verification_every == 0:
+                return "Supported: YES\nRelevant: YES\nAdditional Details: Answer is grounded in the context."
+            return self._verification_json()
+        if "verification reply could not be parsed" in prompt:
+            return self._verification_json()
+        context = prompt.split("**Context:**", 1)[-1]
+        words = _TOKEN_RE.findall(context)[: self.answer_words]
+        return " ".join(words) or "I cannot answer this question based on the provided documents."
+
+    @staticmethod
+    def _verification_json() -> str:
+        return json.dumps({
+            "supported": True,
+            "unsupported_claims": [],
+            "contradictions": [],
+            "relevant": True,
+            "additional_details": "Answer is grounded in the context.",
+        })
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        content = self._reply(prompt)
+
+        # Rough token estimate: ~0.75 words per token
+        prompt_tokens = int(len(prompt.split()) / 0.75)
+        completion_tokens = int(len(content.split()) / 0.75)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
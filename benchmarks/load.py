@@ -0,0 +1,294 @@
+"""
+Concurrent load driver for DocChat. N simulated users each upload a document set and then ask
+a series of questions, against one of two targets:
+
+1. "workflow" (default): in-process DocumentProcessor + IngestionManager + AgentWorkflow, with
+   the LLM and embedding clients pointed at the stub server (benchmarks/stub_server.py, started
+   in-process unless --base-url is given) or replaced by the in-process fakes (--backend fake).
+   Questions pass through a semaphore of --app-concurrency slots, emulating the app's event queue.
+2. "app": a running DocChat UI, driven through gradio_client (start it against the stub server
+   as shown in benchmarks/stub_server.py).
+
+The JSON report has throughput, upload/question latency percentiles, and a queueing breakdown
+(app event queue, ingestion pool, stub server slots) ranked by total time spent waiting, next to
+the per-stage instrumentation.
+
+Usage:
+    python -m benchmarks.load --users 8 --questions 3 --max-concurrency 4
+    python -m benchmarks.load --target app --app-url http://127.0.0.1:5000 --users 4 --output load.json
+"""
+
+import argparse
+import json
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.stub_server import StubBackend, serve
+from config.settings import settings
+from utils.instrumentation import Histogram, metrics
+from utils.logging import logger
+
+
+def _latency(hist: Histogram) -> Dict:
+    summary = hist.summary()
+    if not summary["count"]:
+        return {"count": 0}
+    return {
+        "count": summary["count"],
+        "p50_ms": round(summary["p50"], 1),
+        "p95_ms": round(summary["p95"], 1),
+        "p99_ms": round(summary["p99"], 1),
+        "max_ms": round(summary["max"], 1),
+    }
+
+
+def _queue_point(summary: Optional[Dict]) -> Optional[Dict]:
+    if not summary or not summary.get("count"):
+        return None
+    return {
+        "waits": summary["count"],
+        "mean_ms": round(summary["mean"], 1),
+        "p95_ms": round(summary["p95"], 1),
+        "total_s": round(summary["sum"] / 1000, 3),
+    }
+
+
+def queueing_report(points: Dict[str, Optional[Dict]]) -> Dict[str, Dict]:
+    """Queue wait summaries, the point with the most total waiting first."""
+    points = {name: _queue_point(summary) for name, summary in points.items()}
+    ranked = sorted((item for item in points.items() if item[1]), key=lambda item: -item[1]["total_s"])
+    return dict(ranked)
+
+
+def fetch_stub_stats(base_url: str) -> Dict:
+    """GET /stats from an external stub server (empty if it isn't one)."""
+    root = base_url.rstrip("/").rsplit("/v1", 1)[0]
+    try:
+        with urllib.request.urlopen(f"{root}/stats", timeout=5) as response:
+            return json.load(response)
+    except Exception as e:
+        logger.warning(f"Could not read stub server stats from {root}: {e}")
+        return {}
+
+
+class LoadRun:
+    """Shared bookkeeping for the simulated users."""
+
+    def __init__(self):
+        self.upload = Histogram()
+        self.question = Histogram()
+        self.app_queue_wait = Histogram()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def error(self, kind: str, e: Exception) -> None:
+        logger.warning(f"{kind} failed: {e}")
+        with self._lock:
+            self.errors[kind] += 1
+
+
+def build_workflow_target(args, workdir: Path):
+    """Return (user_fn, stub_stats_fn) for the in-process workflow target."""
+    from agents.workflow import AgentWorkflow
+    from document_processor.file_handler import DocumentProcessor
+    from document_processor.ingestion import IngestionManager
+    from retriever.builder import RetrieverBuilder
+
+    settings.CHROMA_DB_PATH = str(workdir / "chroma")
+    if args.vector_backend:
+        settings.VECTOR_BACKEND = args.vector_backend
+
+    stub_stats: Callable[[], Dict] = dict
+    if args.backend == "fake":
+        from agents.model_router import ModelRouter
+        from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+
+        builder = RetrieverBuilder(embeddings=FakeEmbeddings())
+        router = ModelRouter(small=FakeChatModel(model_name="fake-small"), large=FakeChatModel(model_name="fake-large"))
+        workflow = AgentWorkflow(router=router)
+    else:
+        base_url = args.base_url
+        if base_url is None:
+            backend = StubBackend(
+                latency_s=args.latency,
+                tokens_per_s=args.tokens_per_s,
+                embedding_latency_s=args.embedding_latency,
+                max_concurrency=args.max_concurrency,
+            )
+            server = serve(backend)
+            base_url = f"http://127.0.0.1:{server.server_port}/v1"
+            stub_stats = backend.stats.snapshot
+        else:
+            stub_stats = lambda: fetch_stub_stats(base_url)  # noqa: E731
+        settings.GROQ_BASE_URL = base_url
+        settings.GROQ_API_KEY = settings.GROQ_API_KEY or "stub"
+        settings.EMBEDDINGS_BASE_URL = base_url
+        builder = RetrieverBuilder()
+        workflow = AgentWorkflow()
+
+    processor = DocumentProcessor()
+    processor.cache_dir = workdir / "cache"
+    processor.cache_dir.mkdir(parents=True, exist_ok=True)
+    ingestion = IngestionManager(lambda: processor, lambda: builder, max_workers=args.ingest_workers)
+    app_slots = threading.Semaphore(args.app_concurrency) if args.app_concurrency else None
+
+    def user(run: LoadRun, user_id: int, paths: List[str], questions: List[str]) -> None:
+        files = [SimpleNamespace(name=path) for path in paths]
+        start = time.perf_counter()
+        try:
+            job = ingestion.submit(f"user-{user_id}", files, frozenset(paths))
+            retriever = job.wait()
+            run.upload.observe((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            run.error("upload", e)
+            return
+
+        for question in questions:
+            time.sleep(args.think_time)
+            start = time.perf_counter()
+            if app_slots is not None:
+                app_slots.acquire()
+            run.app_queue_wait.observe((time.perf_counter() - start) * 1000)
+            try:
+                workflow.full_pipeline(question=question, retriever=retriever)
+                run.question.observe((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                run.error("question", e)
+            finally:
+                if app_slots is not None:
+                    app_slots.release()
+        ingestion.discard(f"user-{user_id}")
+
+    return user, stub_stats
+
+
+def build_app_target(args):
+    """Return (user_fn, stub_stats_fn) for a running DocChat UI."""
+    from gradio_client import Client, handle_file
+
+    stub_stats = (lambda: fetch_stub_stats(args.base_url)) if args.base_url else dict
+
+    def user(run: LoadRun, user_id: int, paths: List[str], questions: List[str]) -> None:
+        client = Client(args.app_url, verbose=False)
+        start = time.perf_counter()
+        try:
+            # The progress handler streams until ingestion is done
+            client.submit([handle_file(p) for p in paths], api_name="/start_ingestion").result()
+            run.upload.observe((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            run.error("upload", e)
+            return
+
+        for question in questions:
+            time.sleep(args.think_time)
+            start = time.perf_counter()
+            try:
+                answer, _ = client.predict(question, [handle_file(p) for p in paths], api_name="/process_question")
+                if answer.startswith("❌"):
+                    raise RuntimeError(answer)
+                run.question.observe((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                run.error("question", e)
+        client.close()
+
+    return user, stub_stats
+
+
+def run(args) -> Dict:
+    workdir = Path(tempfile.mkdtemp(prefix="docchat-load-"))
+    corpora = [
+        generate_corpus(str(workdir / f"corpus_{i}"), docs=args.docs, sections=args.sections,
+                        paragraphs=args.paragraphs, seed=args.seed + i)
+        for i in range(args.corpora or args.users)
+    ]
+
+    metrics.reset()
+    if args.target == "app":
+        user, stub_stats = build_app_target(args)
+    else:
+        user, stub_stats = build_workflow_target(args, workdir)
+
+    load = LoadRun()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="docchat-user") as pool:
+        for i in range(args.users):
+            corpus = corpora[i % len(corpora)]
+            questions = [corpus["questions"][(i + n) % len(corpus["questions"])] for n in range(args.questions)]
+            pool.submit(user, load, i, corpus["file_paths"], questions)
+            if args.ramp_up:
+                time.sleep(args.ramp_up / args.users)
+    elapsed = time.perf_counter() - start
+
+    stages = metrics.snapshot()
+    stub = stub_stats()
+    return {
+        "config": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "throughput": {
+            "uploads_per_s": round(load.upload.summary()["count"] / elapsed, 3),
+            "questions_per_s": round(load.question.summary()["count"] / elapsed, 3),
+        },
+        "latency": {"upload": _latency(load.upload), "question": _latency(load.question)},
+        "errors": dict(load.errors),
+        "queueing": queueing_report({
+            "app_event_queue": load.app_queue_wait.summary(),
+            "ingest_pool": stages.get("ingest.queue_wait_ms"),
+            "stub_chat": stub.get("chat.queue_wait_ms"),
+            "stub_embeddings": stub.get("embeddings.queue_wait_ms"),
+        }),
+        "stages": stages,
+        "stub_server": stub,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent DocChat load test")
+    parser.add_argument("--target", choices=["workflow", "app"], default="workflow")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=3, help="questions per user")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between a user's questions")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds over which users start")
+    parser.add_argument("--corpora", type=int, default=0, help="distinct document sets (0 = one per user)")
+    parser.add_argument("--docs", type=int, default=2)
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    # workflow target
+    parser.add_argument("--backend", choices=["stub", "fake"], default="stub",
+                        help="stub: HTTP clients against the stub server; fake: in-process fake models")
+    parser.add_argument("--base-url", help="external stub server, e.g. http://127.0.0.1:8089/v1")
+    parser.add_argument("--app-concurrency", type=int, default=1,
+                        help="questions processed at once, like the app's event queue (0 = unlimited)")
+    parser.add_argument("--ingest-workers", type=int, default=None)
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy"])
+    # in-process stub server
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--tokens-per-s", type=float, default=500.0)
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    parser.add_argument("--max-concurrency", type=int, default=0)
+    # app target
+    parser.add_argument("--app-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2, default=str)
+    if args.output:
+        Path(args.output).write_text(report)
+        logger.info("Load test report written to {}", args.output)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
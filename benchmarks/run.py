@@ -0,0 +1,252 @@
+"""
+Offline benchmark suite for DocChat. It measures:
+
+1. DocumentProcessor.process, cold (empty cache) and cached
+2. RetrieverBuilder.build_hybrid_retriever
+3. Retrieval latency of the hybrid retriever
+4. AgentWorkflow.full_pipeline end to end, with a small and a large fake model behind the
+   model router (--routing-policy), so per-route latency and cost can be compared
+5. The same with the second-stage reranker (--reranker), reporting latency and LLM prompt
+   tokens per question with and without it
+
+Embeddings and chat models are replaced by the deterministic fakes in benchmarks/fakes.py,
+so no network access or API keys are needed. Results (p50/p95 latency, throughput, peak RSS
+and the per-stage instrumentation breakdown) are written as JSON.
+
+Usage:
+    python -m benchmarks.run --corpus examples --iterations 3
+    python -m benchmarks.run --corpus synthetic --docs 10 --sections 40 --output bench.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from agents.model_router import ModelRouter
+from agents.relevance_checker import RelevanceChecker
+from agents.research_agent import ResearchAgent
+from agents.verification_agent import VerificationAgent
+from agents.workflow import AgentWorkflow
+from benchmarks.corpus import generate_corpus
+from benchmarks.fakes import FakeChatModel, FakeCrossEncoder, FakeEmbeddings
+from config.settings import settings
+from document_processor.file_handler import DocumentProcessor
+from retriever.builder import RetrieverBuilder
+from retriever.reranker import Reranker
+from utils.instrumentation import Histogram, llm_usage_scope, metrics
+from utils.logging import logger
+
+EXAMPLE_QUESTIONS = [
+    "What is multi-head attention and why is it used?",
+    "What BLEU score does the Transformer achieve on English-to-German translation?",
+    "Summarize DeepSeek-R1 model's performance evaluation on coding tasks against OpenAI o1-mini",
+    "How is DeepSeek-R1-Zero trained with reinforcement learning?",
+]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(name: str, func: Callable[[], int], iterations: int) -> Dict:
+    """
+    Run `func` `iterations` times and summarize latency.
+
+    `func` returns the number of items it handled (files, chunks, queries) for throughput.
+    """
+    hist = Histogram()
+    items = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        items += func() or 0
+        hist.observe((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+
+    summary = hist.summary()
+    result = {
+        "iterations": iterations,
+        "p50_ms": round(summary["p50"], 3),
+        "p95_ms": round(summary["p95"], 3),
+        "mean_ms": round(summary["mean"], 3),
+        "ops_per_s": round(iterations / elapsed, 3) if elapsed else None,
+        "items_per_s": round(items / elapsed, 3) if elapsed and items else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    logger.info("{}: p50={}ms p95={}ms", name, result["p50_ms"], result["p95_ms"])
+    return result
+
+
+def measure_answers(name: str, workflow: AgentWorkflow, retriever, questions: List[str], iterations: int) -> Dict:
+    """measure() full_pipeline over the questions, adding the LLM prompt tokens used per question."""
+    pipeline_stream = iter(questions * iterations)
+    prompt_tokens = Histogram()
+
+    def answer():
+        with llm_usage_scope() as usage:
+            workflow.full_pipeline(question=next(pipeline_stream), retriever=retriever)
+        prompt_tokens.observe(usage["prompt_tokens"])
+        return 1
+
+    result = measure(name, answer, len(questions) * iterations)
+    result["prompt_tokens_mean"] = round(prompt_tokens.summary()["mean"], 1)
+    return result
+
+
+def load_corpus(args, workdir: Path) -> Dict[str, List[str]]:
+    if args.corpus == "examples":
+        paths = sorted(str(p) for p in Path("examples").glob("*.pdf"))
+        return {"file_paths": paths, "questions": EXAMPLE_QUESTIONS}
+    return generate_corpus(
+        str(workdir / "corpus"),
+        docs=args.docs,
+        sections=args.sections,
+        paragraphs=args.paragraphs,
+        seed=args.seed,
+    )
+
+
+def run(args) -> Dict:
+    workdir = Path(tempfile.mkdtemp(prefix="docchat-bench-"))
+    corpus = load_corpus(args, workdir)
+    files = [SimpleNamespace(name=path) for path in corpus["file_paths"]]
+    questions = corpus["questions"][: args.questions]
+    if not files:
+        raise SystemExit(f"No input files found for corpus '{args.corpus}'")
+
+    metrics.reset()
+    results = {}
+
+    # 1) Ingestion, cold: every iteration starts from an empty cache directory
+    processor = DocumentProcessor()
+    cold_runs = iter(range(args.iterations))
+
+    def ingest_cold():
+        processor.cache_dir = workdir / f"cache_{next(cold_runs)}"
+        processor.cache_dir.mkdir(parents=True, exist_ok=True)
+        return len(processor.process(files))
+
+    results["ingest_cold"] = measure("ingest_cold", ingest_cold, args.iterations)
+
+    # 2) Ingestion, cached: reuse the cache populated by the last cold run
+    chunks = []
+
+    def ingest_cached():
+        chunks[:] = processor.process(files)
+        return len(chunks)
+
+    results["ingest_cached"] = measure("ingest_cached", ingest_cached, args.iterations)
+    if not chunks:
+        raise SystemExit("Ingestion produced no chunks (is Docling installed?)")
+
+    # 3) Index build: fresh Chroma directory per iteration so collections don't accumulate
+    builder = RetrieverBuilder(embeddings=FakeEmbeddings(dim=args.embedding_dim))
+    build_runs = iter(range(args.iterations))
+    retrievers = []
+
+    def build():
+        settings.CHROMA_DB_PATH = str(workdir / f"chroma_{next(build_runs)}")
+        retrievers[:] = [builder.build_hybrid_retriever(chunks)]
+        return len(chunks)
+
+    results["build_hybrid_retriever"] = measure("build_hybrid_retriever", build, args.iterations)
+    retriever = retrievers[0]
+    results["chunk_store"] = retriever.retrievers[0].store.stats()
+
+    # 4) Retrieval latency, one sample per question per iteration
+    query_stream = iter(questions * args.iterations)
+    results["retrieval"] = measure(
+        "retrieval", lambda: len(retriever.invoke(next(query_stream))), len(questions) * args.iterations
+    )
+
+    # 5) Question answering through the full LangGraph workflow
+    # The large fake is slower and priced like the 70B model, so routing policies can be compared
+    router = ModelRouter(
+        small=FakeChatModel(model_name="fake-small", latency_s=args.llm_latency,
+                            malformed_verification_every=args.malformed_verification_every),
+        large=FakeChatModel(model_name="fake-large", latency_s=args.llm_latency * args.large_latency_factor,
+                            malformed_verification_every=args.malformed_verification_every),
+        policy=args.routing_policy,
+        costs={
+            "fake-small": settings.MODEL_COSTS[settings.SMALL_MODEL],
+            "fake-large": settings.MODEL_COSTS[settings.LARGE_MODEL],
+        },
+    )
+    agents = dict(
+        researcher=ResearchAgent(router=router),
+        verifier=VerificationAgent(router=router),
+        relevance_checker=RelevanceChecker(router=router),
+    )
+    workflow = AgentWorkflow(**agents)
+    results["full_pipeline"] = measure_answers("full_pipeline", workflow, retriever, questions, args.iterations)
+
+    # 6) The same with the reranker keeping the best --rerank-top-n chunks
+    if args.reranker != "none":
+        model = FakeCrossEncoder(latency_s=args.rerank_latency) if args.reranker == "fake" else None
+        workflow = AgentWorkflow(**agents, reranker=Reranker(model=model, top_n=args.rerank_top_n))
+        results["full_pipeline_rerank"] = measure_answers(
+            "full_pipeline_rerank", workflow, retriever, questions, args.iterations
+        )
+
+    return {
+        "config": {
+            **vars(args),
+            "files": len(files),
+            "chunks": len(chunks),
+            "questions": len(questions),
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+        "stages": metrics.snapshot(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline DocChat benchmark")
+    parser.add_argument("--corpus", choices=["examples", "synthetic"], default="examples")
+    parser.add_argument("--docs", type=int, default=5, help="synthetic: number of documents")
+    parser.add_argument("--sections", type=int, default=20, help="synthetic: sections per document")
+    parser.add_argument("--paragraphs", type=int, default=3, help="synthetic: paragraphs per section")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=10, help="max questions to run")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds per LLM call")
+    parser.add_argument("--large-latency-factor", type=float, default=3.0,
+                        help="latency of the large fake model relative to --llm-latency")
+    parser.add_argument("--routing-policy", choices=["adaptive", "large", "small"], default="adaptive")
+    parser.add_argument("--malformed-verification-every", type=int, default=0,
+                        help="make every n-th verification reply free text to exercise the re-ask path")
+    parser.add_argument("--reranker", choices=["fake", "cross-encoder", "none"], default="fake",
+                        help="second full_pipeline run with reranking (cross-encoder needs sentence-transformers)")
+    parser.add_argument("--rerank-top-n", type=int, default=settings.RERANK_TOP_N)
+    parser.add_argument("--rerank-latency", type=float, default=0.0,
+                        help="fake reranker: simulated seconds per scoring batch")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2, default=str)
+    if args.output:
+        Path(args.output).write_text(report)
+        logger.info("Benchmark report written to {}", args.output)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Local OpenAI-compatible stub for the chat and embedding APIs, for load testing without quota.
+
+* POST /v1/chat/completions answers DocChat's prompts with FakeChatModel's deterministic replies
+* POST /v1/embeddings returns FakeEmbeddings vectors (hashed bag of words, normalized)
+* Latency is simulated as a fixed time to first token plus prompt and completion token rates
+* --max-concurrency limits requests served at once, like a provider rate limit; time spent
+  waiting for a slot is reported per endpoint by GET /stats
+
+Usage:
+    python -m benchmarks.stub_server --port 8089 --latency 0.2 --tokens-per-s 300 --max-concurrency 8
+    GROQ_BASE_URL=http://127.0.0.1:8089/v1 GROQ_API_KEY=stub \\
+        EMBEDDINGS_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+from utils.instrumentation import MetricsRegistry
+from utils.logging import logger
+
+
+def _message_text(message: Dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        # Content parts: [{"type": "text", "text": ...}, ...]
+        content = "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def _estimate_tokens(text: str) -> int:
+    """Same rough estimate FakeChatModel reports: ~0.75 words per token."""
+    return int(len(text.split()) / 0.75)
+
+
+class StubBackend:
+    def __init__(self, latency_s: float = 0.1, tokens_per_s: float = 500.0, prefill_tokens_per_s: float = 0.0,
+                 embedding_latency_s: float = 0.02, embedding_s_per_text: float = 0.001,
+                 max_concurrency: int = 0, embedding_dim: int = 384):
+        """
+        * Chat requests take `latency_s` + prompt tokens / `prefill_tokens_per_s` (0 = free)
+          + completion tokens / `tokens_per_s`
+        * Embedding requests take `embedding_latency_s` + `embedding_s_per_text` per input
+        * At most `max_concurrency` requests (0 = unlimited) are served at once; others queue
+        """
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.embedding_latency_s = embedding_latency_s
+        self.embedding_s_per_text = embedding_s_per_text
+        self.chat = FakeChatModel()
+        self.embeddings = FakeEmbeddings(dim=embedding_dim)
+        self.stats = MetricsRegistry()
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    @contextmanager
+    def _slot(self, endpoint: str):
+        """Hold a serving slot, recording how long the request queued for it and how long it ran."""
+        start = time.perf_counter()
+        if self._slots is not None:
+            self._slots.acquire()
+        acquired = time.perf_counter()
+        self.stats.observe(f"{endpoint}.queue_wait_ms", (acquired - start) * 1000)
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+            self.stats.observe(f"{endpoint}.service_ms", (time.perf_counter() - acquired) * 1000)
+
+    def chat_completion(self, body: Dict) -> Dict:
+        prompt = "\n".join(_message_text(m) for m in body.get("messages", []))
+        with self._slot("chat"):
+            content = self.chat._reply(prompt)
+            limit = body.get("max_completion_tokens") or body.get("max_tokens")
+            if limit:
+                content = " ".join(content.split(" ")[: max(1, int(limit * 0.75))])
+            prompt_tokens = _estimate_tokens(prompt)
+            completion_tokens = _estimate_tokens(content)
+
+            delay = self.latency_s + completion_tokens / self.tokens_per_s
+            if self.prefill_tokens_per_s:
+                delay += prompt_tokens / self.prefill_tokens_per_s
+            time.sleep(delay)
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def create_embeddings(self, body: Dict) -> Dict:
+        texts: List[str] = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        with self._slot("embeddings"):
+            vectors = self.embeddings.embed_documents(texts)
+            time.sleep(self.embedding_latency_s + self.embedding_s_per_text * len(texts))
+        tokens = sum(_estimate_tokens(text) for text in texts)
+        return {
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vectors)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the OpenAI client's connection pool expects
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.backend.stats.snapshot())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        backend: StubBackend = self.server.backend
+        if body.get("stream"):
+            self._send_json(400, {"error": {"message": "Streaming is not supported by the stub server"}})
+        elif self.path.endswith("/chat/completions"):
+            self._send_json(200, backend.chat_completion(body))
+        elif self.path.endswith("/embeddings"):
+            self._send_json(200, backend.create_embeddings(body))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def log_message(self, format, *args):
+        logger.trace("stub server: " + format, *args)
+
+
+def serve(backend: StubBackend, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stub server on a daemon thread; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.backend = backend
+    threading.Thread(target=server.serve_forever, name="docchat-stub-server", daemon=True).start()
+    logger.info("Stub server listening on http://{}:{}/v1", host, server.server_port)
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible chat/embedding stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds to first token per chat request")
+    parser.add_argument("--tokens-per-s", type=float, default=500.0, help="completion token rate")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=0.0, help="prompt token rate (0 = free)")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="seconds per embedding request")
+    parser.add_argument("--embedding-s-per-text", type=float, default=0.001)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="requests served at once (0 = unlimited)")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    return parser.parse_args(argv)
+
+
+def backend_from_args(args) -> StubBackend:
+    return StubBackend(
+        latency_s=args.latency,
+        tokens_per_s=args.tokens_per_s,
+        prefill_tokens_per_s=args.prefill_tokens_per_s,
+        embedding_latency_s=args.embedding_latency,
+        embedding_s_per_text=args.embedding_s_per_text,
+        max_concurrency=args.max_concurrency,
+        embedding_dim=args.embedding_dim,
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = serve(backend_from_args(args), args.host, args.port)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
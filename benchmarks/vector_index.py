@@ -0,0 +1,163 @@
+"""
+Vector backend benchmark: Chroma vs. the in-process NumpyVectorIndex.
+
+For each backend it reports build time, query latency (p50/p95), recall@k against exact
+float32 search, and memory (index bytes for the numpy index, RSS growth for Chroma).
+Embeddings are random unit vectors with planted near-duplicates of each query, so no
+embedding model is needed.
+
+Usage:
+    python -m benchmarks.vector_index --sizes 1000 5000 --dim 384 --queries 200
+    python -m benchmarks.vector_index --sizes 60000 --ann-threshold 50000 --output vectors.json
+"""
+
+import argparse
+import gc
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from retriever.vector_index import NumpyVectorIndex
+from utils.instrumentation import Histogram
+from utils.logging import logger
+
+
+def current_rss_mb() -> float:
+    """Current resident set size from /proc (Linux); 0 elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * 4096 / (1024 * 1024)
+    except OSError:
+        return 0.0
+
+
+def make_data(n: int, dim: int, queries: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Queries are perturbed copies of stored vectors, like a question close to one chunk
+    picks = rng.choice(n, size=queries, replace=False if queries <= n else True)
+    query_vectors = vectors[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32) / np.sqrt(dim)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+
+def exact_top_k(vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> List[set]:
+    scores = query_vectors @ vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def summarize(build_s: float, latencies: Histogram, found: List[set], truth: List[set],
+              k: int, memory_mb: float) -> Dict:
+    summary = latencies.summary()
+    recall = np.mean([len(f & t) / k for f, t in zip(found, truth)])
+    return {
+        "build_s": round(build_s, 4),
+        "query_p50_ms": round(summary["p50"], 4),
+        "query_p95_ms": round(summary["p95"], 4),
+        f"recall@{k}": round(float(recall), 4),
+        "memory_mb": round(memory_mb, 2),
+    }
+
+
+def bench_numpy(vectors, query_vectors, truth, k, quantization, ann_threshold, args) -> Dict:
+    gc.collect()
+    start = time.perf_counter()
+    index = NumpyVectorIndex(
+        dim=vectors.shape[1], quantization=quantization, ann_threshold=ann_threshold,
+        m=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search,
+    )
+    for offset in range(0, len(vectors), args.batch_size):
+        index.add(vectors[offset:offset + args.batch_size])
+    index.wait_for_graph()  # The HNSW graph is built in the background
+    build_s = time.perf_counter() - start
+
+    latencies, found = Histogram(), []
+    for query in query_vectors:
+        t0 = time.perf_counter()
+        ids, _ = index.search(query, k)
+        latencies.observe((time.perf_counter() - t0) * 1000)
+        found.append(set(ids.tolist()))
+    return summarize(build_s, latencies, found, truth, k, index.nbytes / (1024 * 1024))
+
+
+def bench_chroma(vectors, query_vectors, truth, k, args) -> Dict:
+    import chromadb
+
+    gc.collect()
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    client = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="docchat-bench-chroma-"))
+    collection = client.create_collection("bench", metadata={"hnsw:space": "ip"})
+    for offset in range(0, len(vectors), args.batch_size):
+        batch = vectors[offset:offset + args.batch_size]
+        collection.add(
+            ids=[str(i) for i in range(offset, offset + len(batch))],
+            embeddings=batch.tolist(),
+            documents=[""] * len(batch),
+        )
+    build_s = time.perf_counter() - start
+
+    latencies, found = Histogram(), []
+    for query in query_vectors:
+        t0 = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies.observe((time.perf_counter() - t0) * 1000)
+        found.append({int(i) for i in result["ids"][0]})
+    return summarize(build_s, latencies, found, truth, k, current_rss_mb() - rss_before)
+
+
+def run(args) -> Dict:
+    results = {}
+    for n in args.sizes:
+        vectors, query_vectors = make_data(n, args.dim, args.queries, args.seed)
+        truth = exact_top_k(vectors, query_vectors, args.k)
+        row = {}
+        for quantization in ("float32", "int8"):
+            row[f"numpy_exact_{quantization}"] = bench_numpy(
+                vectors, query_vectors, truth, args.k, quantization, ann_threshold=n + 1, args=args)
+            if n > args.ann_threshold:
+                row[f"numpy_hnsw_{quantization}"] = bench_numpy(
+                    vectors, query_vectors, truth, args.k, quantization, ann_threshold=args.ann_threshold, args=args)
+        if not args.skip_chroma:
+            row["chroma"] = bench_chroma(vectors, query_vectors, truth, args.k, args)
+        results[str(n)] = row
+        logger.info("n={}: {}", n, row)
+    return {"config": vars(args), "results": results}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chroma vs. NumpyVectorIndex benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--ann-threshold", type=int, default=50000,
+                        help="sizes above this are also measured with the HNSW graph")
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(report)
+        logger.info("Benchmark report written to {}", args.output)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
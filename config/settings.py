@@ -1,12 +1,13 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 from .constants import MAX_FILE_SIZE, MAX_TOTAL_SIZE, ALLOWED_TYPES, GROQ_BASE_URL
 import os
 
 class Settings(BaseSettings):
-    # Required settings
-    OPENAI_API_KEY: str
-    GROQ_API_KEY: str
-    HUGGINGFACE_API_KEY: str
+    # Required settings (validated when the client that needs them is created, see require())
+    OPENAI_API_KEY: Optional[str] = None
+    GROQ_API_KEY: Optional[str] = None
+    HUGGINGFACE_API_KEY: Optional[str] = None
 
     # Optional settings with defaults
     MAX_FILE_SIZE: int = MAX_FILE_SIZE
@@ -22,13 +23,102 @@ class Settings(BaseSettings):
     VECTOR_SEARCH_K: int = 10
     HYBRID_RETRIEVER_WEIGHTS: list = [0.4, 0.6]
 
+    # Reranking settings (see retriever/reranker.py; needs sentence-transformers)
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_TOP_N: int = 4  # Chunks kept for the research and verification prompts
+    RERANK_BATCH_SIZE: int = 16
+    RERANK_CACHE_SIZE: int = 10000  # (query, chunk) scores kept
+
+    # Embedding settings
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDINGS_BASE_URL: Optional[str] = None  # OpenAI-compatible endpoint (e.g. benchmarks.stub_server) instead of HuggingFace
+
+    # Vector backend settings ("chroma" or the in-process "numpy" index)
+    VECTOR_BACKEND: str = "chroma"
+    VECTOR_QUANTIZATION: str = "float32"  # numpy backend: "float32" or "int8"
+    # numpy backend: exact search up to this many chunks, HNSW above. At dim 384 (p50, benchmarks/
+    # vector_index.py) exact float32 search takes 1.6 ms at 20k vectors, 2.5 ms at 30k and 7 ms at 50k,
+    # while HNSW queries take ~3.5 ms with lower recall and minutes of graph building
+    VECTOR_ANN_THRESHOLD: int = 50000
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 100
+    HNSW_EF_SEARCH: int = 64
+    VECTOR_INDEX_DIR: Optional[str] = None  # Where memory-mapped index files live (system temp dir by default)
+
     # Logging settings
     LOG_LEVEL: str = "INFO"
+    LOG_PAYLOAD_LIMIT: int = 500  # Max characters of prompts/responses/context written per record
+    LOG_PAYLOAD_SAMPLE_RATE: float = 1.0  # Fraction of payload records that are actually written
+
+    # Profiling settings (see utils/profiling.py)
+    PROFILING_ENABLED: bool = False  # Profile every request, not only those sending PROFILING_HEADER
+    PROFILING_HEADER: str = "X-DocChat-Profile"
+    PROFILING_MODE: str = "sampling"  # "sampling" (folded stacks for flame graphs) or "cprofile" (pstats)
+    PROFILING_INTERVAL_MS: float = 5.0  # sampling: time between stack samples
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_FILES: int = 50  # Oldest profiles are deleted beyond this many
+
+    # Chunking settings (token bounds for the split that follows header splitting)
+    CHUNK_MAX_TOKENS: int = 512
+    CHUNK_OVERLAP_TOKENS: int = 64
+    CHUNK_MIN_TOKENS: int = 64
+
+    # Model routing settings
+    SMALL_MODEL: str = "llama-3.1-8b-instant"
+    LARGE_MODEL: str = "llama-3.3-70b-versatile"
+    MODEL_ROUTING_POLICY: str = "adaptive"  # "adaptive", "large" (70B for relevance/research) or "small"
+    ROUTING_MAX_QUESTION_TOKENS: int = 48  # adaptive: longer questions go to the large model
+    ROUTING_MAX_CONTEXT_TOKENS: int = 4000  # adaptive: so does a larger retrieved context
+    MODEL_COSTS: dict = {  # USD per million (prompt, completion) tokens
+        "llama-3.1-8b-instant": (0.05, 0.08),
+        "llama-3.3-70b-versatile": (0.59, 0.79),
+    }
+
+    # Conversation settings
+    SESSION_MAX_TURNS: int = 5  # Prior turns kept per session for follow-up questions
+    SESSION_REUSE_RELEVANCE_MAX_NEW: float = 0.5  # Condensed follow-ups with at most this share of unseen chunks keep the last relevance label
+
+    # Verification settings
+    VERIFICATION_MAX_RETRIES: int = 1  # Re-asks of the verifier alone when its JSON reply doesn't parse
+    MAX_RESEARCH_ROUNDS: int = 2  # Research + verification rounds before an unsupported answer is returned
+
+    # Deduplication settings
+    DEDUP_NEAR_DUPLICATES: bool = True  # Also drop near-identical chunks from other files (e.g. unchanged sections of a revision)
+    DEDUP_THRESHOLD: float = 0.9  # Estimated Jaccard similarity of word shingles counted as a duplicate
+    DEDUP_NUM_PERM: int = 128  # MinHash permutations, split into LSH bands to match the threshold
+    DEDUP_SHINGLE_SIZE: int = 3  # Words per shingle
+
+    # Concurrency settings for the Gradio app
+    GRADIO_CONCURRENCY_LIMIT: int = 8  # Questions answered at once (mostly waiting on LLM calls)
+    GRADIO_MAX_QUEUE_SIZE: Optional[int] = 100  # Events waiting beyond this are rejected (None = unbounded)
+    GRADIO_MAX_THREADS: int = 64  # Worker threads; upload progress handlers hold one each while polling
+
+    # Ingestion settings
+    INGEST_WORKERS: int = 2  # Background threads converting and indexing uploads
+
+    # Streaming ingestion settings
+    STREAMING_INGEST: bool = False  # Answer from early pages while later ones are still ingesting
+    STREAMING_PAGE_BATCH: int = 10  # PDF pages converted per Docling call when streaming
+
+    # Startup settings
+    LAZY_STARTUP: bool = True  # Defer heavy imports and model clients until first use
+    PREWARM: bool = True  # With LAZY_STARTUP, initialize them in the background once the UI is serving
+
+    # Prebuilt index bundles (see retriever/bundle.py), loaded at startup
+    BUNDLE_DIR: Optional[str] = "bundles"
 
     # New cache settings with type annotations
     CACHE_DIR: str = "document_cache"
     CACHE_EXPIRE_DAYS: int = 7
 
+    def require(self, name: str) -> str:
+        """Return a required setting, failing with a clear message if it is not configured."""
+        value = getattr(self, name, None)
+        if not value:
+            raise ValueError(f"{name} is not set. Add it to the environment or the .env file.")
+        return value
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -0,0 +1,169 @@
+"""
+Chunk deduplication across the files of one upload. Key features include:
+
+1. Exact duplicates are detected by the SHA-256 of the chunk text
+2. Near duplicates (e.g. the same section in two revisions of a report) are detected with MinHash
+   signatures over word shingles and LSH banding, then confirmed by estimated Jaccard similarity.
+   Only chunks from different files (by content hash, not name: two revisions may share a file
+   name) are compared, so similar passages within one file (e.g. the 2022 and 2023 versions of a
+   table) are both kept
+3. A near duplicate whose numbers differ from the matching chunk (e.g. a revision with updated
+   figures) is kept alongside it: uploads don't say which revision is current, so neither copy
+   is dropped. Near duplicates with the same numbers, and exact duplicates, are dropped
+4. The first occurrence of a chunk is kept; the files its duplicates came from are recorded in
+   its "sources" metadata
+5. A report of chunks, tokens and bytes kept out of the indexes
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.instrumentation import get_trace_id, metrics
+from utils.logging import logger
+from utils.tokens import count_tokens
+
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+SOURCES_SEPARATOR = "; "  # "sources" is a string: vector store metadata values must be scalars
+
+
+def _lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Choose (bands, rows) with bands * rows == num_perm so that the LSH S-curve,
+    whose inflection is at (1 / bands) ** (1 / rows), sits closest to `threshold`.
+    """
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class ChunkDeduplicator:
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 3,
+                 near_duplicates: bool = True, seed: int = 1):
+        """
+        * `threshold` is the estimated Jaccard similarity of word shingle sets at or above which
+          two chunks count as duplicates
+        * `num_perm` MinHash permutations are split into LSH bands matching the threshold
+        * With `near_duplicates` off, only exact duplicates are removed
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.near_duplicates = near_duplicates
+        self.bands, self.rows = _lsh_params(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and 32-bit shingle hashes keep a * h + b within uint64
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+        self._exact: Dict[str, Document] = {}
+        self._kept: List[Document] = []
+        self._origins: List[Optional[str]] = []  # File (content hash) of each kept chunk
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self.stats = {"chunks": 0, "exact": 0, "near": 0, "tokens_saved": 0, "bytes_saved": 0}
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm uint64 values) of the text's word shingles."""
+        words = _WORD_RE.findall(text.lower())
+        k = min(self.shingle_size, len(words)) or 1
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = ((hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _find_near_duplicate(self, chunk: Document, origin: Optional[str], signature: np.ndarray,
+                             keys: List[bytes]) -> Optional[int]:
+        """
+        Index of the most similar kept chunk sharing a band with `signature`, if similar enough,
+        from another file than `origin` and with the same numbers as `chunk`.
+        """
+        candidates = {i for band, key in enumerate(keys) for i in self._buckets[band].get(key, ())}
+        numbers = None
+        best, best_similarity = None, self.threshold
+        for i in candidates:
+            kept = self._kept[i]
+            if origin is not None and self._origins[i] == origin:
+                continue
+            similarity = float(np.mean(self._signatures[i] == signature))
+            if similarity < best_similarity:
+                continue
+            if numbers is None:
+                numbers = _NUMBER_RE.findall(chunk.page_content)
+            if _NUMBER_RE.findall(kept.page_content) == numbers:
+                best, best_similarity = i, similarity
+        return best
+
+    def _record_duplicate(self, kept: Document, duplicate: Document, kind: str) -> None:
+        self.stats[kind] += 1
+        self.stats["tokens_saved"] += count_tokens(duplicate.page_content)
+        self.stats["bytes_saved"] += len(duplicate.page_content.encode())
+
+        source = duplicate.metadata.get("source")
+        sources = kept.metadata.get("sources", kept.metadata.get("source", ""))
+        sources = [s for s in sources.split(SOURCES_SEPARATOR) if s]
+        if source and source not in sources:
+            sources.append(source)
+            kept.metadata["sources"] = SOURCES_SEPARATOR.join(sources)
+
+    def filter(self, chunks: List[Document], origin: Optional[str] = None) -> List[Document]:
+        """
+        Return the chunks that duplicate nothing seen so far (by this instance).
+
+        `origin` identifies the file the chunks come from (e.g. its content hash); near duplicates
+        are only looked for among chunks of other origins. Without it, all kept chunks are compared.
+
+        Duplicates update the "sources" metadata of the chunk they match. That chunk may have
+        been returned by an earlier call, so already-indexed copies of its metadata can lag behind.
+        """
+        unique = []
+        for chunk in chunks:
+            self.stats["chunks"] += 1
+            content_hash = hashlib.sha256(chunk.page_content.encode()).hexdigest()
+            if content_hash in self._exact:
+                self._record_duplicate(self._exact[content_hash], chunk, "exact")
+                continue
+
+            if self.near_duplicates:
+                signature = self.signature(chunk.page_content)
+                keys = self._band_keys(signature)
+                match = self._find_near_duplicate(chunk, origin, signature, keys)
+                if match is not None:
+                    self._record_duplicate(self._kept[match], chunk, "near")
+                    continue
+                for band, key in enumerate(keys):
+                    self._buckets[band].setdefault(key, []).append(len(self._kept))
+                self._signatures.append(signature)
+
+            self._exact[content_hash] = chunk
+            self._kept.append(chunk)
+            self._origins.append(origin)
+            unique.append(chunk)
+        return unique
+
+    def report(self) -> Dict:
+        """Summary of what was removed, also logged and recorded in the metrics registry."""
+        dropped = self.stats["exact"] + self.stats["near"]
+        report = {
+            **self.stats,
+            "kept": self.stats["chunks"] - dropped,
+            "dropped_pct": round(100 * dropped / self.stats["chunks"], 1) if self.stats["chunks"] else 0.0,
+        }
+        metrics.observe("dedup.chunks_dropped", dropped)
+        metrics.observe("dedup.tokens_saved", self.stats["tokens_saved"])
+        logger.bind(metric="dedup", trace_id=get_trace_id(), **report).info(
+            f"Deduplication removed {self.stats['exact']} exact and {self.stats['near']} near-duplicate chunks "
+            f"({report['dropped_pct']}%), saving {self.stats['tokens_saved']} tokens "
+            f"and {self.stats['bytes_saved']} bytes of index text"
+        )
+        return report
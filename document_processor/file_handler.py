@@ -4,20 +4,75 @@ This class handles document parsing, caching, and chunking. Key features include
 1. Validating file sizes before processing
 2. Using caching to avoid redundant processing of previously uploaded files
 3. Extracting structured content from documents using Docling
-4. Splitting text into chunks using MarkdownHeaderTextSplitter for better retrieval in vector databases
+4. Splitting text into chunks using MarkdownHeaderTextSplitter for better retrieval in vector databases,
+   then bounding chunk sizes in tokens (recursive splitting with overlap, merging undersized neighbors)
+5. Optionally streaming large PDFs page range by page range, yielding chunks as they are produced
+6. Removing exact and near-duplicate chunks across files (see dedup.py), keeping their provenance
 """
 
 import os
+import json
 import hashlib
 import pickle
+import statistics
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
-from docling.document_converter import DocumentConverter
-from langchain_text_splitters import MarkdownHeaderTextSplitter
+from typing import Dict, Iterator, List, Optional
+from langchain_core.documents import Document
+from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+from pypdf import PdfReader
 from config import constants
 from config.settings import settings
 from utils.logging import logger
+from utils.instrumentation import timed
+from utils.profiling import profile
+from utils.concurrency import KeyedLocks, atomic_write
+from utils.tokens import count_tokens, tokenizer_name
+from document_processor.dedup import ChunkDeduplicator
+
+# Shared by all processors: concurrent uploads of the same file convert it once. The lock of a
+# cache file guards the cache check, its _conversions entry and the final cache write
+_cache_locks = KeyedLocks()
+_conversions: Dict[str, "_Conversion"] = {}
+
+
+def _copy_chunks(batch: List[Document]) -> List[Document]:
+    # Callers tag and deduplicate chunks in place; the published originals stay as converted
+    return [Document(page_content=chunk.page_content, metadata=dict(chunk.metadata)) for chunk in batch]
+
+
+class _Conversion:
+    """Chunk batches of a file as one session converts it, for other sessions uploading the same file."""
+
+    def __init__(self):
+        self.batches: List[List[Document]] = []
+        self.completed = None  # True once cached, False if the converting session failed or stopped
+        self._cond = threading.Condition()
+
+    def publish(self, batch: List[Document]) -> None:
+        with self._cond:
+            self.batches.append(batch)
+            self._cond.notify_all()
+
+    def finish(self, completed: bool) -> None:
+        with self._cond:
+            self.completed = completed
+            self._cond.notify_all()
+
+    def follow(self) -> Iterator[List[Document]]:
+        """Yield copies of the batches, as they are published, until the conversion finishes."""
+        i = 0
+        while True:
+            with self._cond:
+                while i == len(self.batches) and self.completed is None:
+                    self._cond.wait()
+                pending, finished = self.batches[i:], self.completed is not None
+            for batch in pending:
+                yield _copy_chunks(batch)
+            i += len(pending)
+            if finished and not pending:
+                return
 
 
 class DocumentProcessor:
@@ -26,6 +81,23 @@ class DocumentProcessor:
         self.headers = [("#", "Header 1"), ("##", "Header 2")]
         self.cache_dir = Path(settings.CACHE_DIR)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._docling_converter = None
+        self._converter_lock = threading.Lock()
+
+        # Token bounds for the secondary (size-aware) split, and the tokenizer they are measured
+        # with (tiktoken, or the offline estimate); part of the cache key
+        self.chunk_config = {
+            "headers": self.headers,
+            "tokenizer": tokenizer_name(),
+            "max_tokens": settings.CHUNK_MAX_TOKENS,
+            "overlap_tokens": settings.CHUNK_OVERLAP_TOKENS,
+            "min_tokens": settings.CHUNK_MIN_TOKENS,
+        }
+        self.size_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=settings.CHUNK_MAX_TOKENS,
+            chunk_overlap=settings.CHUNK_OVERLAP_TOKENS,
+            length_function=count_tokens,
+        )
         
     def validate_files(self, files: List) -> None:
         """
@@ -47,41 +119,124 @@ class DocumentProcessor:
         * Generates a hash of each file's content to check if it has been processed before
         * If cached, loads the data from cache
         * If not cached, processes the file using _process_file() and stores the results in cache
-        * Ensures that no duplicate chunks are stored across multiple files
+        * Ensures that no duplicate or near-duplicate chunks are stored across multiple files
+        """
+        with profile("process"):
+            all_chunks = [chunk for batch in self.process_stream(files, page_batch_size=0) for chunk in batch]
+        logger.info(f"Total unique chunks: {len(all_chunks)}")
+        return all_chunks
+
+    def process_stream(self, files: List, page_batch_size: int = None) -> Iterator[List]:
+        """
+        Incremental variant of process() that yields chunk batches as soon as they are ready
+
+        * Cached files are yielded as a single batch
+        * Uncached PDFs are converted `page_batch_size` pages at a time (settings.STREAMING_PAGE_BATCH
+          by default, 0 converts whole files), so only one page range's Docling document is held in
+          memory at once
+        * Each file is written to the cache once all of its batches have been produced; concurrent
+          uploads of the same file share one conversion (see _convert_and_cache())
+        * Chunks are deduplicated across files exactly as in process(), and tagged with
+          their file name in the "source" metadata (display only: files are told apart by content hash)
         """
+        if page_batch_size is None:
+            page_batch_size = settings.STREAMING_PAGE_BATCH
+        # Page batches change chunk boundaries, so whole-file and streamed chunks are cached separately
+        chunk_config = self.chunk_config_for(page_batch_size)
+        config_hash = self._generate_hash(json.dumps(chunk_config, sort_keys=True).encode())[:12]
+
         self.validate_files(files)
-        all_chunks = []
-        seen_hashes = set()
+        deduplicator = ChunkDeduplicator(
+            threshold=settings.DEDUP_THRESHOLD,
+            num_perm=settings.DEDUP_NUM_PERM,
+            shingle_size=settings.DEDUP_SHINGLE_SIZE,
+            near_duplicates=settings.DEDUP_NEAR_DUPLICATES,
+        )
         
         for file in files:
             try:
                 # Generate content-based hash for caching
-                with open(file.name, "rb") as f:
-                    file_hash = self._generate_hash(f.read())
-                
-                cache_path = self.cache_dir / f"{file_hash}.pkl"
-                
-                if self._is_cache_valid(cache_path):
-                    logger.info(f"Loading from cache: {file.name}")
-                    chunks = self._load_from_cache(cache_path)
-                else:
-                    logger.info(f"Processing and caching: {file.name}")
-                    chunks = self._process_file(file)
-                    self._save_to_cache(chunks, cache_path)
+                with timed("ingest.hash", file=file.name):
+                    with open(file.name, "rb") as f:
+                        file_hash = self._generate_hash(f.read())
                 
-                # Deduplicate chunks across files
-                for chunk in chunks:
-                    chunk_hash = self._generate_hash(chunk.page_content.encode())
-                    if chunk_hash not in seen_hashes:
-                        all_chunks.append(chunk)
-                        seen_hashes.add(chunk_hash)
-                        
+                cache_path = self.cache_dir / f"{file_hash}_{config_hash}.pkl"
+                batches = self._convert_and_cache(file, cache_path, chunk_config)
+                source = os.path.basename(file.name)
+                for batch in batches:
+                    for chunk in batch:
+                        chunk.metadata["source"] = source
+                    # Deduplicate chunks across files
+                    with timed("ingest.dedup", file=file.name, chunks=len(batch)):
+                        unique = deduplicator.filter(batch, origin=file_hash)
+                    if unique:
+                        yield unique
+
             except Exception as e:
                 logger.error(f"Failed to process {file.name}: {str(e)}")
                 continue
-                
-        logger.info(f"Total unique chunks: {len(all_chunks)}")
-        return all_chunks
+
+        deduplicator.report()
+
+    def _convert_and_cache(self, file, cache_path: Path, chunk_config: dict) -> Iterator[List]:
+        """
+        Convert a file into chunk batches, yielding each one as soon as it is produced, then cache them
+
+        * The per-file lock is only held to check the cache and to write it, never while yielding
+        * A session uploading a file that another session is converting follows that conversion's
+          batches instead of converting it again; if the converting session fails or stops early,
+          the follower converts the rest itself
+        """
+        key = str(cache_path)
+        chunks, leader = self._load_cached(cache_path), False
+        if chunks is None:
+            with _cache_locks.lock(key):
+                chunks = self._load_cached(cache_path)
+                conversion = _conversions.get(key) if chunks is None else None
+                leader = chunks is None and conversion is None
+                if leader:
+                    conversion = _conversions[key] = _Conversion()
+        if chunks is not None:
+            logger.info(f"Loading from cache: {file.name}")
+            yield chunks
+            return
+
+        followed = 0
+        if not leader:
+            logger.info(f"Following another session's conversion of {file.name}")
+            for batch in conversion.follow():
+                followed += 1
+                yield batch
+            if conversion.completed:
+                return
+            logger.info(f"Conversion of {file.name} was abandoned, converting it again")
+            conversion = None  # Not registered: another retry would only duplicate the work
+
+        logger.info(f"Processing and caching: {file.name}")
+        file_chunks = []
+        try:
+            for i, batch in enumerate(self._iter_file_chunks(file, chunk_config["page_batch_size"])):
+                file_chunks.extend(batch)
+                if conversion is not None:
+                    conversion.publish(batch)
+                if i >= followed:  # Batches already received from the abandoned conversion are skipped
+                    yield _copy_chunks(batch)
+            with _cache_locks.lock(key):
+                self._save_to_cache(file_chunks, cache_path, chunk_config)
+                if conversion is not None:
+                    del _conversions[key]
+        except BaseException:  # Includes GeneratorExit when the caller stops early (e.g. cancelled ingestion)
+            if conversion is not None:
+                with _cache_locks.lock(key):
+                    _conversions.pop(key, None)
+                conversion.finish(False)
+            raise
+        if conversion is not None:
+            conversion.finish(True)
+
+    def chunk_config_for(self, page_batch_size: int) -> dict:
+        """The chunking config of a run converting PDFs `page_batch_size` pages at a time (0: whole files)."""
+        return {**self.chunk_config, "page_batch_size": page_batch_size}
 
     def _process_file(self, file) -> List:
         """
@@ -95,10 +250,137 @@ class DocumentProcessor:
             logger.warning(f"Skipping unsupported file type: {file.name}")
             return []
 
-        converter = DocumentConverter()
-        markdown = converter.convert(file.name).document.export_to_markdown()
-        splitter = MarkdownHeaderTextSplitter(self.headers)
-        return splitter.split_text(markdown)
+        with timed("ingest.convert", file=file.name):
+            converter = self._converter()
+            markdown = converter.convert(file.name).document.export_to_markdown()
+
+        return self._split_markdown(markdown, file.name)
+
+    def _iter_file_chunks(self, file, page_batch_size: int) -> Iterator[List]:
+        """
+        Streaming counterpart of _process_file()
+
+        * Non-PDF files, and PDFs that fit in a single batch, fall back to _process_file()
+        * Otherwise converts pages [start, start + page_batch_size) per Docling call and
+          yields that range's chunks before converting the next one
+        * Chunks at the top of a range that precede any header inherit the last headers of
+          the previous range, so sections spanning a page boundary keep their metadata
+        """
+        page_count = self._pdf_page_count(file.name) if file.name.endswith(".pdf") else 0
+        if page_batch_size <= 0 or page_count <= page_batch_size:
+            yield self._process_file(file)
+            return
+
+        converter = self._converter()
+        last_headers = {}
+        for start in range(1, page_count + 1, page_batch_size):
+            end = min(start + page_batch_size - 1, page_count)
+            with timed("ingest.convert", file=file.name, pages=f"{start}-{end}"):
+                document = converter.convert(file.name, page_range=(start, end)).document
+                markdown = document.export_to_markdown()
+            del document
+
+            chunks = self._split_markdown(markdown, file.name)
+            names = [name for _, name in self.headers]
+            for chunk in chunks:
+                if names[0] in chunk.metadata:
+                    break
+                # Fill in the header levels above the chunk's own (all of them if it has none)
+                present = [i for i, name in enumerate(names) if name in chunk.metadata]
+                for name in names[:present[0] if present else len(names)]:
+                    if name in last_headers:
+                        chunk.metadata[name] = last_headers[name]
+            if chunks:
+                last_headers = {name: chunks[-1].metadata[name] for name in names if name in chunks[-1].metadata}
+
+            logger.info(f"Converted pages {start}-{end} of {page_count}: {file.name}")
+            yield chunks
+
+    def _converter(self):
+        """
+        Returns the shared Docling converter, importing Docling on first use.
+
+        Docling is heavy to import and initialize, and files served from the cache never need it.
+        """
+        with self._converter_lock:
+            if self._docling_converter is None:
+                from docling.document_converter import DocumentConverter
+                self._docling_converter = DocumentConverter()
+        return self._docling_converter
+
+    def warmup(self) -> None:
+        """
+        Imports Docling and initializes its PDF pipeline (layout/OCR models) ahead of the first upload.
+        """
+        from docling.datamodel.base_models import InputFormat
+        self._converter().initialize_pipeline(InputFormat.PDF)
+
+    def _split_markdown(self, markdown: str, source: str) -> List:
+        """
+        Two-stage chunking of Markdown text
+
+        * Splits on the configured headers with MarkdownHeaderTextSplitter
+        * Splits any section above CHUNK_MAX_TOKENS recursively, with CHUNK_OVERLAP_TOKENS overlap
+        * Merges chunks below CHUNK_MIN_TOKENS into their neighbor when the result still fits
+        """
+        with timed("ingest.split", file=source) as fields:
+            splitter = MarkdownHeaderTextSplitter(self.headers)
+            sections = splitter.split_text(markdown)
+            chunks = self._merge_small_chunks(self.size_splitter.split_documents(sections))
+            fields["sections"] = len(sections)
+            fields["chunks"] = len(chunks)
+        return chunks
+
+    def _merge_small_chunks(self, chunks: List) -> List:
+        """
+        Merges undersized chunks into the preceding chunk of the same top-level section.
+
+        Only headers shared by both chunks are kept on the merged chunk.
+        """
+        top_header = self.headers[0][1]
+        merged, merged_tokens = [], []
+        for chunk in chunks:
+            tokens = count_tokens(chunk.page_content)
+            if (merged
+                    and min(tokens, merged_tokens[-1]) < settings.CHUNK_MIN_TOKENS
+                    and tokens + merged_tokens[-1] <= settings.CHUNK_MAX_TOKENS
+                    and merged[-1].metadata.get(top_header) == chunk.metadata.get(top_header)):
+                previous = merged[-1]
+                merged[-1] = Document(
+                    page_content=f"{previous.page_content}\n\n{chunk.page_content}",
+                    metadata={k: v for k, v in previous.metadata.items() if chunk.metadata.get(k) == v},
+                )
+                merged_tokens[-1] += tokens
+            else:
+                merged.append(chunk)
+                merged_tokens.append(tokens)
+        return merged
+
+    def _chunk_stats(self, chunks: List) -> dict:
+        """
+        Token-size statistics for a list of chunks, stored alongside them in the cache.
+        """
+        sizes = sorted(count_tokens(chunk.page_content) for chunk in chunks)
+        if not sizes:
+            return {"count": 0}
+        return {
+            "count": len(sizes),
+            "min_tokens": sizes[0],
+            "max_tokens": sizes[-1],
+            "mean_tokens": round(statistics.fmean(sizes), 1),
+            "median_tokens": statistics.median(sizes),
+            "total_tokens": sum(sizes),
+        }
+
+    def _pdf_page_count(self, path: str) -> int:
+        """
+        Returns the number of pages in a PDF without rendering it (0 if it can't be read).
+        """
+        try:
+            return len(PdfReader(path).pages)
+        except Exception as e:
+            logger.warning(f"Could not read page count of {path}: {e}")
+            return 0
 
     def _generate_hash(self, content: bytes) -> str:
         """
@@ -106,10 +388,19 @@ class DocumentProcessor:
         """
         return hashlib.sha256(content).hexdigest()
 
-    def _save_to_cache(self, chunks: List, cache_path: Path):
-        with open(cache_path, "wb") as f:
+    def _save_to_cache(self, chunks: List, cache_path: Path, chunk_config: dict):
+        """
+        Stores chunks together with the chunking config and chunk size statistics.
+
+        Written atomically, so concurrent readers see either no cache file or a complete one.
+        """
+        stats = self._chunk_stats(chunks)
+        logger.info(f"Chunk stats for {cache_path.name}: {stats}")
+        with atomic_write(cache_path) as f:
             pickle.dump({
                 "timestamp": datetime.now().timestamp(),
+                "chunk_config": chunk_config,
+                "stats": stats,
                 "chunks": chunks
             }, f)
 
@@ -121,6 +412,18 @@ class DocumentProcessor:
             data = pickle.load(f)
         return data["chunks"]
 
+    def _load_cached(self, cache_path: Path) -> Optional[List]:
+        """
+        Returns the cached chunks if the cache file is valid and readable, else None.
+        """
+        if not self._is_cache_valid(cache_path):
+            return None
+        try:
+            return self._load_from_cache(cache_path)
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError) as e:
+            logger.warning(f"Ignoring unreadable cache file {cache_path.name}: {e}")
+            return None
+
     def _is_cache_valid(self, cache_path: Path) -> bool:
         """
         Checks if the cache is still valid based on its age.
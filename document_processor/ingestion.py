@@ -0,0 +1,224 @@
+"""
+Background ingestion of uploaded documents. Key features include:
+
+1. Ingestion (Docling conversion, chunking, index building) starts as soon as files are uploaded,
+   on a shared thread pool, instead of on the first question
+2. At most one job per session: re-submitting the same files returns the in-flight job, while a
+   different upload cancels the superseded one
+3. Jobs expose progress for the UI and a wait() for questions submitted mid-ingest
+4. With settings.STREAMING_INGEST, a job becomes answerable after its first chunk batch
+5. Uploads matching a prebuilt index bundle are ready immediately, without any ingestion work
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from config.settings import settings
+from utils.instrumentation import metrics, timed
+from utils.logging import logger
+from utils.profiling import profile
+
+
+class IngestionCancelled(Exception):
+    """Raised inside a job that was superseded by a newer upload."""
+
+
+class IngestionJob:
+    def __init__(self, file_hashes: frozenset, file_count: int):
+        self.file_hashes = file_hashes
+        self.file_count = file_count
+        self.status = "queued"
+        self.chunks = 0
+        self.started_at = time.monotonic()
+        self.retriever = None
+        self.error: Optional[BaseException] = None
+        self.future = None
+        self._cancelled = threading.Event()
+        self._ready = threading.Event()  # retriever usable (possibly still being extended)
+        self._done = threading.Event()  # job finished: ready, failed or cancelled
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def cancel(self) -> None:
+        """Ask the job to stop; it does so between chunk batches."""
+        self._cancelled.set()
+        if self.future is not None and self.future.cancel():
+            self._finish("cancelled")
+
+    def check_cancelled(self) -> None:
+        if self.cancelled:
+            raise IngestionCancelled()
+
+    def mark_ready(self, retriever) -> None:
+        self.retriever = retriever
+        self._ready.set()
+
+    def _finish(self, status: str, error: Optional[BaseException] = None) -> None:
+        self.status = status
+        self.error = error
+        self._ready.set()
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        Block until the retriever is usable and return it.
+
+        Raises the job's error if it failed, or IngestionCancelled if it was superseded.
+        """
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Document ingestion is still in progress")
+        if self.retriever is None:
+            if self.cancelled:
+                raise IngestionCancelled()
+            raise self.error or RuntimeError("Document ingestion failed")
+        return self.retriever
+
+    def describe(self) -> str:
+        """One-line progress message for the UI."""
+        elapsed = time.monotonic() - self.started_at
+        messages = {
+            "queued": "⏳ Waiting to start processing...",
+            "processing": f"⚙️ Processing {self.file_count} file(s): {self.chunks} chunks so far ({elapsed:.0f}s)",
+            "indexing": f"🗂️ Building search index over {self.chunks} chunks ({elapsed:.0f}s)",
+            "streaming": f"⚡ Ready for questions; still ingesting ({self.chunks} chunks so far, {elapsed:.0f}s)",
+            "ready": f"✅ Documents ready: {self.chunks} chunks indexed in {elapsed:.1f}s",
+            "prebuilt": "✅ Documents ready (prebuilt index)",
+            "cancelled": "🚫 Processing cancelled (documents changed)",
+            "failed": f"❌ Processing failed: {self.error}",
+        }
+        return messages[self.status]
+
+
+class IngestionManager:
+    def __init__(self, get_processor: Callable, get_retriever_builder: Callable, max_workers: int = None,
+                 get_prebuilt: Optional[Callable] = None):
+        """
+        `get_processor` / `get_retriever_builder` return the shared DocumentProcessor and
+        RetrieverBuilder (e.g. LazyResource.get), resolved on the worker thread.
+        `get_prebuilt`, if given, maps file hashes to a ready retriever (e.g. from an index bundle) or None.
+        """
+        self._get_processor = get_processor
+        self._get_retriever_builder = get_retriever_builder
+        self._get_prebuilt = get_prebuilt
+        self._prebuilt_error: Optional[Exception] = None  # Set once the lookup failed; not retried
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.INGEST_WORKERS, thread_name_prefix="docchat-ingest"
+        )
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, files: List, file_hashes: frozenset) -> IngestionJob:
+        """
+        Start ingesting `files` for a session.
+
+        Returns the session's current job if it is for the same files; otherwise cancels it
+        and starts a new one.
+        """
+        # Outside the lock: the first lookup may load every bundle
+        prebuilt = self._prebuilt(file_hashes)
+        with self._lock:
+            current = self._jobs.get(session_id)
+            if current is not None and current.file_hashes == file_hashes and not current.cancelled \
+                    and current.status not in ("failed", "cancelled"):
+                return current
+            if current is not None:
+                logger.info(f"Cancelling superseded ingestion for session {session_id}")
+                current.cancel()
+
+            job = IngestionJob(file_hashes, len(files))
+            if prebuilt is not None:
+                job.mark_ready(prebuilt)
+                job._finish("prebuilt")
+                self._jobs[session_id] = job
+                return job
+
+            context = contextvars.copy_context()
+            job.future = self._executor.submit(context.run, self._run, job, list(files))
+            self._jobs[session_id] = job
+            return job
+
+    def _prebuilt(self, file_hashes: frozenset):
+        if self._get_prebuilt is None or self._prebuilt_error is not None:
+            return None
+        try:
+            return self._get_prebuilt(file_hashes)
+        except Exception as e:
+            # Fall back to regular ingestion, for this and all later uploads
+            logger.warning(f"Prebuilt index lookup failed, prebuilt indexes are disabled: {e}")
+            self._prebuilt_error = e
+            return None
+
+    def get(self, session_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(session_id)
+
+    def discard(self, session_id: str) -> None:
+        """Cancel and forget a session's job (e.g. when the browser tab closes)."""
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+        if job is not None and not job.done:
+            job.cancel()
+
+    def _run(self, job: IngestionJob, files: List) -> None:
+        # Time spent waiting for a free worker
+        metrics.observe("ingest.queue_wait_ms", (time.monotonic() - job.started_at) * 1000)
+        try:
+            job.check_cancelled()
+            job.status = "processing"
+            processor = self._get_processor()
+            builder = self._get_retriever_builder()
+
+            with profile("ingest"), timed("ingest.background", files=len(files)) as fields:
+                batches = processor.process_stream(files, page_batch_size=None if settings.STREAMING_INGEST else 0)
+                try:
+                    if settings.STREAMING_INGEST:
+                        self._ingest_streaming(job, batches, builder)
+                    else:
+                        self._ingest(job, batches, builder)
+                finally:
+                    batches.close()
+                fields["chunks"] = job.chunks
+            job._finish("ready")
+        except IngestionCancelled:
+            logger.info("Ingestion cancelled")
+            job._finish("cancelled")
+        except Exception as e:
+            logger.error(f"Background ingestion failed: {e}")
+            job._finish("failed", e)
+
+    def _ingest(self, job: IngestionJob, batches, builder) -> None:
+        chunks = []
+        for batch in batches:
+            job.check_cancelled()
+            chunks.extend(batch)
+            job.chunks = len(chunks)
+        if not chunks:
+            raise ValueError("No content could be extracted from the uploaded documents")
+        job.check_cancelled()
+        job.status = "indexing"
+        job.mark_ready(builder.build_hybrid_retriever(chunks))
+
+    def _ingest_streaming(self, job: IngestionJob, batches, builder) -> None:
+        retriever = None
+        for batch in batches:
+            job.check_cancelled()
+            if not batch:
+                continue
+            job.chunks += len(batch)
+            if retriever is None:
+                retriever = builder.build_hybrid_retriever(batch)
+                job.status = "streaming"
+                job.mark_ready(retriever)
+            else:
+                builder.extend_hybrid_retriever(retriever, batch)
+        if retriever is None:
+            raise ValueError("No content could be extracted from the uploaded documents")
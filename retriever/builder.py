@@ -1,45 +1,103 @@
 from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpointEmbeddings
-from langchain_community.retrievers import BM25Retriever
 from langchain.retrievers import EnsembleRetriever
+from langchain_core.embeddings import Embeddings
 from config.settings import settings
-import logging
+from retriever.chunk_store import ChunkBM25Retriever, ChunkStore, ChunkVectorRetriever
+from retriever.vector_index import NumpyVectorStore
+from utils.instrumentation import timed
+from utils.logging import logger
+from typing import Dict, List
+import threading
+import weakref
 
-logger = logging.getLogger(__name__)
+_chroma_clients: Dict[str, object] = {}
+_chroma_clients_lock = threading.Lock()
+
+
+def _chroma_client(path: str):
+    """One Chroma client per persist directory, shared by every retriever using it."""
+    import chromadb
+
+    with _chroma_clients_lock:
+        if path not in _chroma_clients:
+            _chroma_clients[path] = chromadb.PersistentClient(path=path)
+        return _chroma_clients[path]
+
+
+def _drop_collection(client, name: str) -> None:
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass  # Already gone, or Chroma is shutting down
+
+
+class TimedEmbeddings(Embeddings):
+    """Embeddings wrapper that records embedding latency for instrumentation."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts):
+        with timed("index.embed_documents", texts=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with timed("retrieval.embed_query"):
+            return self.embeddings.embed_query(text)
 
 class RetrieverBuilder:
-    def __init__(self):
-        """Initialize the retriever builder with embeddings."""
+    def __init__(self, embeddings: Embeddings = None):
+        """
+        Initialize the retriever builder with embeddings.
+
+        Defaults to the HuggingFace endpoint, or to the OpenAI-compatible server at
+        settings.EMBEDDINGS_BASE_URL if set; any LangChain `Embeddings` can be passed in instead.
+        """
 
         logger.info("Initializing embeddings...")
-        hf_embeddings = HuggingFaceEndpointEmbeddings(
-            model= "sentence-transformers/all-MiniLM-L6-v2",
-            task="feature-extraction",
-            huggingfacehub_api_token=settings.HUGGINGFACE_API_KEY
-        )
-        self.embeddings = hf_embeddings
+        if embeddings is None and settings.EMBEDDINGS_BASE_URL:
+            embeddings = OpenAIEmbeddings(
+                model=settings.EMBEDDING_MODEL,
+                base_url=settings.EMBEDDINGS_BASE_URL,
+                api_key=settings.OPENAI_API_KEY or "unused",
+                # Send raw text: token-level chunking needs tiktoken and OpenAI model names
+                check_embedding_ctx_length=False
+            )
+        elif embeddings is None:
+            embeddings = HuggingFaceEndpointEmbeddings(
+                model=settings.EMBEDDING_MODEL,
+                task="feature-extraction",
+                huggingfacehub_api_token=settings.require("HUGGINGFACE_API_KEY")
+            )
+        self.embeddings = TimedEmbeddings(embeddings)
         logger.info("Embeddings initialized successfully.")
 
+    def warmup(self) -> None:
+        """Issue one embedding request so the endpoint is awake before the first upload."""
+        self.embeddings.embed_query("warmup")
+
     def build_hybrid_retriever(self, docs):
-        """Build a hybrid retriever using BM25 and vector-based retrieval."""
+        """
+        Build a hybrid retriever using BM25 and vector-based retrieval.
+
+        The chunks are held once, in a ChunkStore shared by both retrievers; they return
+        `Document`s materialized from it, with `id` set to the chunk ID.
+        """
         try:
-            # Create Chroma vector store
-            vector_store = Chroma.from_documents(
-                documents=docs,
-                embedding=self.embeddings,
-                persist_directory=settings.CHROMA_DB_PATH
-            )
+            store = ChunkStore.from_documents(docs)
+            logger.info("Chunk store created: {}", store.stats())
+
+            # Create the vector-based retriever (includes embedding time, also recorded separately)
+            vector_retriever = self._build_vector_retriever(store)
             logger.info("Vector store created successfully.")
             
             # Create BM25 retriever
-            bm25 = BM25Retriever.from_documents(docs)
+            with timed("index.bm25_build", chunks=len(store)):
+                bm25 = ChunkBM25Retriever.from_store(store)
             logger.info("BM25 retriever created successfully.")
             
-            # Create vector-based retriever
-            vector_retriever = vector_store.as_retriever(search_kwargs={"k": settings.VECTOR_SEARCH_K})
-            logger.info("Vector retriever created successfully.")
-            
             # Combine retrievers into a hybrid retriever
             hybrid_retriever = EnsembleRetriever(
                 retrievers=[bm25, vector_retriever],
@@ -49,4 +107,60 @@ class RetrieverBuilder:
             return hybrid_retriever
         except Exception as e:
             logger.error(f"Failed to build hybrid retriever: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def _build_vector_retriever(self, store: ChunkStore):
+        """
+        Create the vector store selected by settings.VECTOR_BACKEND over the chunks in `store`.
+
+        * "chroma": a Chroma collection under CHROMA_DB_PATH for this document set only, holding
+          chunk IDs as metadata; it is deleted once the chunk store is garbage collected
+        * "numpy": in-process NumpyVectorStore (float32/int8, exact search or HNSW above the threshold)
+        """
+        if settings.VECTOR_BACKEND == "numpy":
+            with timed("index.numpy_build", chunks=len(store)):
+                vector_store = NumpyVectorStore(
+                    self.embeddings,
+                    store=store,
+                    quantization=settings.VECTOR_QUANTIZATION,
+                    ann_threshold=settings.VECTOR_ANN_THRESHOLD,
+                    m=settings.HNSW_M,
+                    ef_construction=settings.HNSW_EF_CONSTRUCTION,
+                    ef_search=settings.HNSW_EF_SEARCH,
+                )
+                vector_store.add_chunks(range(len(store)))
+            return vector_store.as_retriever(search_kwargs={"k": settings.VECTOR_SEARCH_K})
+        if settings.VECTOR_BACKEND != "chroma":
+            raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND}")
+
+        client = _chroma_client(settings.CHROMA_DB_PATH)
+        collection_name = f"{settings.CHROMA_COLLECTION_NAME}-{store.uid}"
+        weakref.finalize(store, _drop_collection, client, collection_name)
+        with timed("index.chroma_build", chunks=len(store)):
+            vector_retriever = ChunkVectorRetriever(
+                vectorstore=Chroma(collection_name=collection_name, embedding_function=self.embeddings, client=client),
+                store=store,
+                k=settings.VECTOR_SEARCH_K
+            )
+            vector_retriever.add_chunks(range(len(store)))
+        return vector_retriever
+
+    def extend_hybrid_retriever(self, retriever: EnsembleRetriever, docs: List) -> EnsembleRetriever:
+        """
+        Add documents to an existing hybrid retriever in place.
+
+        * The chunks are appended to the shared ChunkStore, then to the vector store (Chroma or
+          numpy); only the new chunks are embedded
+        * BM25 has no incremental update, so it is rebuilt over all chunks and swapped in
+        """
+        bm25, vector_retriever = retriever.retrievers
+        chunk_ids = bm25.store.add_documents(docs)
+        with timed("index.vector_extend", chunks=len(docs)):
+            if isinstance(vector_retriever, ChunkVectorRetriever):
+                vector_retriever.add_chunks(chunk_ids)
+            else:
+                vector_retriever.vectorstore.add_chunks(chunk_ids)
+        with timed("index.bm25_build", chunks=len(bm25.store)):
+            retriever.retrievers[0] = ChunkBM25Retriever.from_store(bm25.store, range(chunk_ids.stop), k=bm25.k)
+        logger.info(f"Hybrid retriever extended with {len(docs)} chunks.")
+        return retriever
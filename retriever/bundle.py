@@ -0,0 +1,327 @@
+"""
+Portable, prebuilt index bundles for known document sets. Key features include:
+
+1. One file per document set with its chunks, embeddings, BM25 index and a manifest
+   (source file hashes, chunking config, embedding model)
+2. The manifest carries a format version and a SHA-256 checksum of every member, verified on load
+3. Loading rebuilds the hybrid retriever without Docling conversion or embedding calls
+   (the vector side always uses the in-process NumpyVectorStore)
+4. BundleRegistry maps the file hashes of an upload to a loaded bundle's retriever, so the app
+   can answer questions about known documents immediately
+
+Usage:
+    python -m retriever.bundle export --name examples --out bundles/examples.docchat examples/*.pdf
+    python -m retriever.bundle import bundles/examples.docchat --bundle-dir /srv/docchat/bundles
+    python -m retriever.bundle verify bundles/examples.docchat
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import shutil
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.retrievers import EnsembleRetriever
+from langchain_core.documents import Document
+
+from config.settings import settings
+from retriever.chunk_store import ChunkBM25Retriever, ChunkStore
+from retriever.vector_index import NumpyVectorStore
+from utils.concurrency import atomic_write
+from utils.instrumentation import timed
+from utils.logging import logger
+
+BUNDLE_FORMAT = "docchat-bundle"
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_SUFFIX = ".docchat"
+_BM25_FIELDS = ("k1", "b", "epsilon", "corpus_size", "avgdl", "doc_freqs", "idf", "doc_len", "average_idf")
+
+
+class BundleError(ValueError):
+    """A bundle file is malformed, corrupted or incompatible with this deployment."""
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content, as the app computes it for uploads."""
+    with open(path, "rb") as f:
+        return _sha256(f.read())
+
+
+class Bundle:
+    def __init__(self, manifest: Dict, documents: List[Document], embeddings: np.ndarray, bm25_state: Dict):
+        self.manifest = manifest
+        self.documents = documents
+        self.embeddings = embeddings
+        self.bm25_state = bm25_state
+
+    @property
+    def name(self) -> str:
+        return self.manifest["name"]
+
+    @property
+    def file_hashes(self) -> frozenset:
+        return frozenset(f["sha256"] for f in self.manifest["files"])
+
+    def build_retriever(self, embedding) -> EnsembleRetriever:
+        """Hybrid retriever over the stored index; `embedding` is only used for query vectors."""
+        with timed("index.bundle_restore", bundle=self.name, chunks=len(self.documents)):
+            from rank_bm25 import BM25Okapi
+
+            store = ChunkStore.from_documents(self.documents)
+            vectorizer = BM25Okapi.__new__(BM25Okapi)
+            vectorizer.__dict__.update({k: v for k, v in self.bm25_state.items() if k != "k"}, tokenizer=None)
+            bm25 = ChunkBM25Retriever(vectorizer=vectorizer, store=store, chunk_ids=range(len(store)),
+                                      k=self.bm25_state["k"])
+
+            vector_store = NumpyVectorStore(
+                embedding,
+                store=store,
+                quantization=settings.VECTOR_QUANTIZATION,
+                ann_threshold=settings.VECTOR_ANN_THRESHOLD,
+                m=settings.HNSW_M,
+                ef_construction=settings.HNSW_EF_CONSTRUCTION,
+                ef_search=settings.HNSW_EF_SEARCH,
+            )
+            vector_store.add_chunks(range(len(store)), self.embeddings)
+        return EnsembleRetriever(
+            retrievers=[bm25, vector_store.as_retriever(search_kwargs={"k": settings.VECTOR_SEARCH_K})],
+            weights=settings.HYBRID_RETRIEVER_WEIGHTS
+        )
+
+
+def export_bundle(paths: List[str], out_path: str, processor, builder, name: Optional[str] = None) -> Dict:
+    """
+    Process `paths` like an upload, embed the chunks and write them to a bundle file.
+
+    `processor` / `builder` are a DocumentProcessor and RetrieverBuilder. Returns the manifest.
+    """
+    chunks = processor.process([SimpleNamespace(name=path) for path in paths])
+    if not chunks:
+        raise BundleError("No chunks were produced from the given documents")
+
+    texts = [chunk.page_content for chunk in chunks]
+    embeddings = np.asarray(builder.embeddings.embed_documents(texts), dtype=np.float32)
+    bm25 = ChunkBM25Retriever.from_store(ChunkStore.from_documents(chunks))
+    bm25_state = {field: getattr(bm25.vectorizer, field) for field in _BM25_FIELDS}
+    bm25_state["k"] = bm25.k
+
+    buffer = io.BytesIO()
+    np.save(buffer, embeddings)
+    members = {
+        "chunks.json": json.dumps(
+            [{"page_content": c.page_content, "metadata": c.metadata} for c in chunks], default=str
+        ).encode(),
+        "embeddings.npy": buffer.getvalue(),
+        "bm25.json": json.dumps(bm25_state).encode(),
+    }
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "name": name or Path(out_path).stem,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "files": [{"name": Path(path).name, "sha256": file_hash(path)} for path in paths],
+        "chunk_config": processor.chunk_config_for(0),  # process() converts whole files
+        "embedding": {"model": settings.EMBEDDING_MODEL, "dim": int(embeddings.shape[1])},
+        "chunks": len(chunks),
+        "checksums": {member: _sha256(data) for member, data in members.items()},
+    }
+
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write(out) as f, zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        bundle.writestr("manifest.json", json.dumps(manifest, indent=2))
+        for member, data in members.items():
+            bundle.writestr(member, data)
+    logger.info(f"Exported bundle '{manifest['name']}' ({len(chunks)} chunks) to {out}")
+    return manifest
+
+
+def _check(condition, path: str, problem: str) -> None:
+    if not condition:
+        raise BundleError(f"Malformed bundle {path}: {problem}")
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_manifest(manifest, path: str) -> None:
+    _check(isinstance(manifest, dict), path, "manifest is not an object")
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"{path} is not a DocChat bundle")
+    version = manifest.get("format_version", 0)
+    _check(_is_int(version), path, "format_version is not an integer")
+    if version > BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"{path} has format version {version}, this version reads up to {BUNDLE_FORMAT_VERSION}")
+
+    checksums = manifest.get("checksums")
+    _check(isinstance(checksums, dict) and all(isinstance(v, str) for v in checksums.values()),
+           path, "checksums is not an object of strings")
+    missing = {"chunks.json", "embeddings.npy", "bm25.json"} - set(checksums)
+    if missing:
+        raise BundleError(f"{path} is missing {', '.join(sorted(missing))}")
+
+    name = manifest.get("name")
+    if not isinstance(name, str) or not name or Path(name).name != name or name in (".", ".."):
+        raise BundleError(f"{path} has an invalid name {name!r}")
+    files = manifest.get("files")
+    _check(isinstance(files, list) and files
+           and all(isinstance(f, dict) and isinstance(f.get("sha256"), str) for f in files),
+           path, "files is not a list of objects with a sha256")
+    embedding = manifest.get("embedding")
+    _check(isinstance(embedding, dict) and isinstance(embedding.get("model"), str)
+           and _is_int(embedding.get("dim")), path, "embedding needs a model name and an integer dim")
+    if embedding["model"] != settings.EMBEDDING_MODEL:
+        raise BundleError(f"{path} was embedded with {embedding['model']}, "
+                          f"but EMBEDDING_MODEL is {settings.EMBEDDING_MODEL}")
+
+
+def _check_index(manifest: Dict, chunks, embeddings: np.ndarray, bm25_state, path: str) -> None:
+    """Chunks, embedding matrix and BM25 state must describe the same chunks."""
+    _check(isinstance(chunks, list) and chunks
+           and all(isinstance(c, dict) and isinstance(c.get("page_content"), str)
+                   and isinstance(c.get("metadata"), dict) for c in chunks),
+           path, "chunks.json is not a list of chunks with page_content and metadata")
+    _check(embeddings.ndim == 2 and np.issubdtype(embeddings.dtype, np.number), path,
+           f"embeddings have shape {embeddings.shape} and dtype {embeddings.dtype}, expected a 2-D numeric array")
+    _check(embeddings.shape == (len(chunks), manifest["embedding"]["dim"]), path,
+           f"embeddings have shape {embeddings.shape}, expected ({len(chunks)}, {manifest['embedding']['dim']})")
+
+    _check(isinstance(bm25_state, dict), path, "bm25.json is not an object")
+    missing = set(_BM25_FIELDS + ("k",)) - set(bm25_state)
+    _check(not missing, path, f"bm25.json is missing {', '.join(sorted(missing))}")
+    _check(_is_int(bm25_state["k"]) and bm25_state["k"] > 0, path, "bm25 k is not a positive integer")
+    _check(bm25_state["corpus_size"] == len(chunks)
+           and isinstance(bm25_state["doc_freqs"], list) and len(bm25_state["doc_freqs"]) == len(chunks)
+           and isinstance(bm25_state["doc_len"], list) and len(bm25_state["doc_len"]) == len(chunks)
+           and isinstance(bm25_state["idf"], dict),
+           path, "bm25 index does not match the chunks")
+
+
+def read_bundle(path: str) -> Bundle:
+    """
+    Read and verify a bundle file (format, version, member checksums, embedding model, and that
+    the chunks, embeddings and BM25 index are well-formed and consistent). Raises BundleError.
+    """
+    try:
+        with zipfile.ZipFile(path) as bundle:
+            manifest = json.loads(bundle.read("manifest.json"))
+            _check_manifest(manifest, path)
+            members = {member: bundle.read(member) for member in manifest["checksums"]}
+    except (OSError, KeyError, zipfile.BadZipFile, json.JSONDecodeError) as e:
+        raise BundleError(f"Could not read bundle {path}: {e}") from e
+
+    for member, expected in manifest["checksums"].items():
+        if _sha256(members[member]) != expected:
+            raise BundleError(f"Checksum mismatch for {member} in {path}")
+
+    try:
+        chunks = json.loads(members["chunks.json"])
+        embeddings = np.load(io.BytesIO(members["embeddings.npy"]), allow_pickle=False)
+        bm25_state = json.loads(members["bm25.json"])
+    except (OSError, ValueError) as e:  # Includes JSONDecodeError and malformed .npy data
+        raise BundleError(f"Malformed bundle {path}: {e!r}") from e
+    _check_index(manifest, chunks, embeddings, bm25_state, path)
+
+    documents = [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in chunks]
+    return Bundle(manifest, documents, embeddings, bm25_state)
+
+
+class BundleRegistry:
+    """Retrievers for prebuilt bundles, keyed by the SHA-256 hashes of their source files."""
+
+    def __init__(self):
+        self._retrievers: Dict[frozenset, EnsembleRetriever] = {}
+        self._names: Dict[frozenset, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._retrievers)
+
+    def add(self, bundle: Bundle, embedding) -> None:
+        self._retrievers[bundle.file_hashes] = bundle.build_retriever(embedding)
+        self._names[bundle.file_hashes] = bundle.name
+
+    def get(self, file_hashes: frozenset) -> Optional[EnsembleRetriever]:
+        return self._retrievers.get(file_hashes)
+
+    def name(self, file_hashes: frozenset) -> Optional[str]:
+        return self._names.get(file_hashes)
+
+    @classmethod
+    def load_dir(cls, directory: Optional[str], embedding) -> "BundleRegistry":
+        """Load every bundle in `directory`; unreadable or incompatible bundles are skipped."""
+        registry = cls()
+        if not directory or not Path(directory).is_dir():
+            return registry
+        for path in sorted(Path(directory).glob(f"*{BUNDLE_SUFFIX}")):
+            try:
+                registry.add(read_bundle(str(path)), embedding)
+                logger.info(f"Loaded bundle {path.name}")
+            except BundleError as e:
+                logger.warning(f"Skipping bundle: {e}")
+            except Exception as e:  # Whatever slipped past validation must not cost the other bundles
+                logger.warning(f"Skipping bundle {path.name}, could not build its index: {e!r}")
+        return registry
+
+
+def _export(args) -> None:
+    from document_processor.file_handler import DocumentProcessor
+    from retriever.builder import RetrieverBuilder
+
+    export_bundle(args.files, args.out, DocumentProcessor(), RetrieverBuilder(), name=args.name)
+
+
+def _import(args) -> None:
+    bundle = read_bundle(args.bundle)
+    target = Path(args.bundle_dir or settings.BUNDLE_DIR)
+    target.mkdir(parents=True, exist_ok=True)
+    # Atomic, so an app (re)starting meanwhile never loads a partial copy
+    # read_bundle() rejects names with path separators, so the copy stays inside `target`
+    with open(args.bundle, "rb") as src, atomic_write(target / f"{Path(bundle.name).name}{BUNDLE_SUFFIX}") as dst:
+        shutil.copyfileobj(src, dst)
+    logger.info(f"Installed bundle '{bundle.name}' ({len(bundle.documents)} chunks) into {target}")
+
+
+def _verify(args) -> None:
+    manifest = read_bundle(args.bundle).manifest
+    print(json.dumps({k: v for k, v in manifest.items() if k != "checksums"}, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export, import and verify DocChat index bundles")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="process and embed documents into a bundle file")
+    export.add_argument("files", nargs="+")
+    export.add_argument("--out", required=True)
+    export.add_argument("--name", help="bundle name (default: output file name)")
+    export.set_defaults(func=_export)
+
+    install = commands.add_parser("import", help="verify a bundle and install it into the bundle directory")
+    install.add_argument("bundle")
+    install.add_argument("--bundle-dir", help="default: settings.BUNDLE_DIR")
+    install.set_defaults(func=_import)
+
+    verify = commands.add_parser("verify", help="verify a bundle and print its manifest")
+    verify.add_argument("bundle")
+    verify.set_defaults(func=_verify)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except BundleError as e:
+        parser.exit(1, f"Error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
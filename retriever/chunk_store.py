@@ -0,0 +1,151 @@
+"""
+Compact in-memory chunk store shared by the retrievers of one document set. Key features include:
+
+1. Chunks are addressed by integer IDs (insertion order) and held once, as a text column plus
+   an array of metadata layout indexes
+2. Metadata dicts are interned: identical dicts (e.g. the same "Header 1"/"Header 2"/"source"
+   values repeated by every chunk of a section) share one tuple of interned strings
+3. BM25 and vector retrievers keep chunk IDs only and materialize LangChain `Document`s
+   when they return results, with `id` set to "<store uid>-<chunk ID>" (unique across stores)
+"""
+
+import sys
+import threading
+import uuid
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from langchain_community.retrievers.bm25 import default_preprocessing_func
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+CHUNK_ID_KEY = "chunk_id"  # Metadata key under which vector stores keep the chunk ID
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ChunkStore:
+    def __init__(self):
+        self.uid = uuid.uuid4().hex  # Distinguishes this store's chunks from other document sets
+        self._texts: List[str] = []
+        self._layout_of = array("I")  # Chunk ID -> index into self._layouts
+        self._layouts: List[tuple] = []
+        self._layout_index: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def _layout(self, metadata: Optional[dict]) -> int:
+        items = tuple((_intern(k), _intern(v)) for k, v in (metadata or {}).items())
+        try:
+            index = self._layout_index.get(items)
+        except TypeError:  # Unhashable metadata values are stored as they are, unshared
+            self._layouts.append(items)
+            return len(self._layouts) - 1
+        if index is None:
+            index = self._layout_index[items] = len(self._layouts)
+            self._layouts.append(items)
+        return index
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[Iterable[dict]] = None) -> range:
+        """Append chunks and return their IDs."""
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(texts)
+        with self._lock:
+            start = len(self._texts)
+            # Layouts go in first so a reader never sees a text without its metadata
+            self._layout_of.extend(self._layout(m) for m in metadatas)
+            self._texts.extend(texts)
+            return range(start, len(self._texts))
+
+    def add_documents(self, documents: Iterable[Document]) -> range:
+        documents = list(documents)
+        return self.add_texts((d.page_content for d in documents), (d.metadata for d in documents))
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document]) -> "ChunkStore":
+        store = cls()
+        store.add_documents(documents)
+        return store
+
+    def text(self, chunk_id: int) -> str:
+        return self._texts[chunk_id]
+
+    def metadata(self, chunk_id: int) -> dict:
+        """A fresh metadata dict, so callers may modify it."""
+        return dict(self._layouts[self._layout_of[chunk_id]])
+
+    def key(self, chunk_id: int) -> str:
+        """ID of a chunk that is unique across stores, used for Document.id and vector store entries."""
+        return f"{self.uid}-{chunk_id}"
+
+    def document(self, chunk_id: int) -> Document:
+        return Document(id=self.key(chunk_id), page_content=self._texts[chunk_id], metadata=self.metadata(chunk_id))
+
+    def documents(self, chunk_ids: Iterable[int]) -> List[Document]:
+        return [self.document(int(i)) for i in chunk_ids]
+
+    def stats(self) -> Dict:
+        """Chunk and metadata layout counts, and the approximate bytes held by the store."""
+        text_bytes = sum(sys.getsizeof(t) for t in self._texts)
+        layout_bytes = sum(sys.getsizeof(layout) for layout in self._layouts)
+        return {
+            "chunks": len(self._texts),
+            "metadata_layouts": len(self._layouts),
+            "bytes": text_bytes + layout_bytes + sys.getsizeof(self._texts) + self._layout_of.buffer_info()[1] * 4,
+        }
+
+
+class ChunkBM25Retriever(BaseRetriever):
+    """BM25 over chunks of a ChunkStore, drop-in for LangChain's BM25Retriever without its `docs` copy."""
+
+    vectorizer: Any
+    store: ChunkStore
+    chunk_ids: Sequence[int]  # BM25 row -> chunk ID (usually a range)
+    k: int = 4
+    preprocess_func: Callable[[str], List[str]] = default_preprocessing_func
+
+    @classmethod
+    def from_store(cls, store: ChunkStore, chunk_ids: Optional[Sequence[int]] = None, k: int = 4,
+                   **kwargs) -> "ChunkBM25Retriever":
+        from rank_bm25 import BM25Okapi
+
+        chunk_ids = range(len(store)) if chunk_ids is None else chunk_ids
+        preprocess_func = kwargs.pop("preprocess_func", default_preprocessing_func)
+        vectorizer = BM25Okapi([preprocess_func(store.text(i)) for i in chunk_ids])
+        return cls(vectorizer=vectorizer, store=store, chunk_ids=chunk_ids, k=k,
+                   preprocess_func=preprocess_func, **kwargs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        scores = self.vectorizer.get_scores(self.preprocess_func(query))
+        top = np.argsort(scores)[::-1][:self.k]
+        return self.store.documents(self.chunk_ids[i] for i in top)
+
+
+class ChunkVectorRetriever(BaseRetriever):
+    """
+    Similarity search over a vector store whose entries carry only a chunk ID in their metadata
+    (e.g. a Chroma collection per document set), returning the chunks from the ChunkStore.
+    """
+
+    vectorstore: VectorStore
+    store: ChunkStore
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        hits = self.vectorstore.similarity_search(query, k=self.k)
+        return self.store.documents(hit.metadata[CHUNK_ID_KEY] for hit in hits)
+
+    def add_chunks(self, chunk_ids: Sequence[int]) -> None:
+        """Embed and add chunks of the store to the vector store."""
+        self.vectorstore.add_texts(
+            [self.store.text(i) for i in chunk_ids],
+            metadatas=[{CHUNK_ID_KEY: i} for i in chunk_ids],
+            ids=[self.store.key(i) for i in chunk_ids],
+        )
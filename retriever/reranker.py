@@ -0,0 +1,104 @@
+"""
+Second-stage reranking of hybrid retrieval results. Key features include:
+
+1. A cross-encoder (sentence-transformers `CrossEncoder`, optional dependency) scores each
+   (query, chunk) pair on CPU, in batches
+2. Only the best `top_n` chunks are kept, so the research and verification prompts carry a few
+   passages instead of every BM25 and vector hit (the relevance check still sees all of them)
+3. An LRU cache of scores keyed by (query, chunk ID), so re-asked questions and research
+   rounds don't score the same pairs again
+4. Without sentence-transformers installed, reranking is skipped with a warning
+
+Any object with a CrossEncoder-style `predict(pairs, batch_size=...)` can be passed in as the
+model (e.g. benchmarks.fakes.FakeCrossEncoder).
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from config.settings import settings
+from utils.instrumentation import metrics, timed
+from utils.logging import logger
+
+
+def _chunk_key(document: Document) -> str:
+    # Chunk store IDs are unique across document sets; hash the content of anything else
+    return document.id or hashlib.sha256(document.page_content.encode()).hexdigest()
+
+
+class Reranker:
+    def __init__(self, model=None, model_name: Optional[str] = None, top_n: Optional[int] = None,
+                 batch_size: Optional[int] = None, cache_size: Optional[int] = None):
+        self.model_name = model_name or settings.RERANK_MODEL
+        self.top_n = top_n or settings.RERANK_TOP_N
+        self.batch_size = batch_size or settings.RERANK_BATCH_SIZE
+        self.cache_size = cache_size if cache_size is not None else settings.RERANK_CACHE_SIZE
+        self._model = model
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._unavailable = False
+
+    def _load_model(self):
+        """The cross-encoder, loaded on first use; None if sentence-transformers is missing."""
+        with self._model_lock:
+            if self._model is None and not self._unavailable:
+                try:
+                    from sentence_transformers import CrossEncoder
+
+                    with timed("rerank.load_model", model=self.model_name):
+                        self._model = CrossEncoder(self.model_name, device="cpu")
+                except ImportError as e:
+                    logger.warning(f"Reranking disabled, sentence-transformers is not installed: {e}")
+                    self._unavailable = True
+            return self._model
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, scores: dict) -> None:
+        with self._cache_lock:
+            self._cache.update(scores)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        """Cross-encoder scores of `documents` for `query`, from the cache where possible."""
+        model = self._load_model()
+        if model is None:
+            raise RuntimeError("No reranking model available")
+
+        keys = [(query, _chunk_key(doc)) for doc in documents]
+        scores = [self._cached(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        metrics.observe("rerank.cache_hits", len(documents) - len(missing))
+        if missing:
+            with timed("rerank.predict", pairs=len(missing)):
+                predicted = model.predict([(query, documents[i].page_content) for i in missing],
+                                          batch_size=self.batch_size)
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+            if self.cache_size:
+                self._store({keys[i]: scores[i] for i in missing})
+        return scores
+
+    def rerank(self, query: str, documents: List[Document], top_n: Optional[int] = None) -> List[Document]:
+        """Return the `top_n` documents that score best for `query`, best first."""
+        top_n = top_n or self.top_n
+        if len(documents) <= 1 or self._load_model() is None:
+            return documents
+
+        with timed("rerank", candidates=len(documents)) as fields:
+            scores = self.score(query, documents)
+            ranked = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:top_n]
+            fields["kept"] = len(ranked)
+        metrics.observe("rerank.chunks_dropped", len(documents) - len(ranked))
+        return [documents[i] for i in ranked]
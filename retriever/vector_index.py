@@ -0,0 +1,355 @@
+"""
+In-process vector index backed by NumPy, a lightweight alternative to Chroma for session-scoped
+document sets. Key features include:
+
+1. Embeddings stored as float32, or int8 with a per-vector scale, in a memory-mapped file
+2. Exact, batched dot-product search while the index is small
+3. An HNSW-style navigable graph once the index grows past `ann_threshold` vectors, built on a
+   background thread: queries use exact search until it is ready, and exact search over the
+   vectors added since the graph was last extended
+4. NumpyVectorStore, a LangChain VectorStore wrapper so RetrieverBuilder can use it like Chroma;
+   it keeps chunk IDs into a (possibly shared) ChunkStore rather than its own documents
+
+Embeddings are expected to be normalized, so dot product equals cosine similarity.
+"""
+
+import heapq
+import math
+import os
+import random
+import tempfile
+import threading
+import weakref
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from config.settings import settings
+from retriever.chunk_store import ChunkStore
+from utils.logging import logger
+
+_SEARCH_BLOCK_ROWS = 65_536
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class NumpyVectorIndex:
+    def __init__(self, dim: int, quantization: str = "float32", path: Optional[str] = None,
+                 ann_threshold: int = 50_000, m: int = 16, ef_construction: int = 100,
+                 ef_search: int = 64, seed: int = 0):
+        """
+        * `quantization` is "float32" (exact) or "int8" (4x smaller, small recall loss)
+        * `path` is the backing file; a temporary file, removed with the index, is used by default
+        * Search is exact up to `ann_threshold` vectors, then an HNSW graph with `m` links per
+          node is built in the background and used with `ef_search` candidates per query
+        """
+        if quantization not in ("float32", "int8"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+
+        self.dim = dim
+        self.quantization = quantization
+        self.ann_threshold = ann_threshold
+        self.ef_search = ef_search
+        self._dtype = np.float32 if quantization == "float32" else np.int8
+        self._hnsw_params = {"m": m, "ef_construction": ef_construction, "seed": seed}
+
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="docchat-vectors-", suffix=".bin", dir=settings.VECTOR_INDEX_DIR)
+            os.close(fd)
+            weakref.finalize(self, _remove_file, path)
+        self.path = path
+
+        self._size = 0
+        self._capacity = 0
+        self._codes = None
+        self._scales = np.ones(0, dtype=np.float32)
+        self._graph = None  # Published graph, never modified; covers ids [0, self._graph.size)
+        self._builder: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the stored vectors (memory-mapped) plus scales and graph links."""
+        links = sum(len(level) for node in self._graph.neighbors for level in node) if self._graph else 0
+        return self._size * self.dim * np.dtype(self._dtype).itemsize + self._scales[:self._size].nbytes + links * 8
+
+    def _grow(self, min_capacity: int) -> None:
+        """Enlarge the backing file (at least doubling it) and re-map it."""
+        capacity = max(min_capacity, self._capacity * 2, 1024)
+        with open(self.path, "r+b" if os.path.exists(self.path) else "w+b") as f:
+            f.truncate(capacity * self.dim * np.dtype(self._dtype).itemsize)
+        if self._codes is not None:
+            self._codes.flush()
+        self._codes = np.memmap(self.path, dtype=self._dtype, mode="r+", shape=(capacity, self.dim))
+        self._scales = np.resize(self._scales, capacity)
+        self._capacity = capacity
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.quantization == "float32":
+            return vectors, np.ones(len(vectors), dtype=np.float32)
+        # Symmetric per-vector quantization: x ~= codes * scale
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def vectors(self, ids) -> np.ndarray:
+        """Return the (dequantized) stored vectors for `ids`."""
+        ids = np.asarray(ids)
+        return self._codes[ids].astype(np.float32) * self._scales[ids, None]
+
+    def add(self, vectors) -> np.ndarray:
+        """Append vectors and return their integer ids (insertion order)."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            start, end = self._size, self._size + len(vectors)
+            if end > self._capacity:
+                self._grow(end)
+            codes, scales = self._encode(vectors)
+            self._codes[start:end] = codes
+            self._scales[start:end] = scales
+            self._size = end
+            if self._size > self.ann_threshold and self._builder is None:
+                self._builder = threading.Thread(target=self._build_graph, name="docchat-hnsw", daemon=True)
+                self._builder.start()
+        return np.arange(start, end)
+
+    def _build_graph(self) -> None:
+        """
+        Extend a copy of the published graph with the vectors it doesn't cover yet, then publish it;
+        repeat until it covers the whole index. Runs on the builder thread, outside the lock, so
+        searches and adds are never blocked by graph construction.
+        """
+        try:
+            while True:
+                with self._lock:
+                    size, graph = self._size, self._graph
+                    if graph is not None and graph.size >= size:
+                        self._builder = None
+                        return
+                graph = graph.copy() if graph is not None else _HnswGraph(self, **self._hnsw_params)
+                for node in range(graph.size, size):
+                    graph.insert(node)
+                with self._lock:
+                    self._graph = graph
+        except Exception as e:
+            logger.error(f"Building the HNSW graph failed, search stays exact: {e}")
+            with self._lock:
+                self._builder = None
+
+    def wait_for_graph(self, timeout: Optional[float] = None) -> None:
+        """Block until the background graph build (if any) has caught up with the index."""
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def search(self, query, k: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the ids and similarity scores of the `k` nearest vectors, best first."""
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        # Search runs outside the lock on a snapshot; later adds never move existing rows
+        with self._lock:
+            graph, size, codes, scales = self._graph, self._size, self._codes, self._scales
+        if graph is None:
+            return self._exact_search(query, k, size, codes, scales)
+
+        ids, scores = graph.search(query, k, max(self.ef_search, k))
+        if graph.size < size:
+            # Vectors added since the graph was last published
+            tail_ids, tail_scores = self._exact_search(query, k, size, codes, scales, start=graph.size)
+            ids, scores = np.concatenate([ids, tail_ids]), np.concatenate([scores, tail_scores])
+            order = np.argsort(-scores)[:k]
+            ids, scores = ids[order], scores[order]
+        return ids, scores
+
+    @staticmethod
+    def _exact_search(query: np.ndarray, k: int, size: int, codes: np.ndarray,
+                      scales: np.ndarray, start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(start, size, _SEARCH_BLOCK_ROWS):
+            end = min(start + _SEARCH_BLOCK_ROWS, size)
+            scores = (codes[start:end].astype(np.float32, copy=False) @ query) * scales[start:end]
+            ids = np.concatenate([best_ids, np.arange(start, end)])
+            scores = np.concatenate([best_scores, scores])
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+                ids, scores = ids[top], scores[top]
+            best_ids, best_scores = ids, scores
+        order = np.argsort(-best_scores)
+        return best_ids[order], best_scores[order]
+
+
+class _HnswGraph:
+    """
+    Hierarchical navigable small-world graph over the vectors of a NumpyVectorIndex.
+
+    Nodes are index ids; neighbor lists are plain Python lists per node and level.
+    """
+
+    def __init__(self, index: NumpyVectorIndex, m: int, ef_construction: int, seed: int):
+        self.index = index
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.level_mult = 1 / math.log(m)
+        self.rng = random.Random(seed)
+        self.neighbors: List[List[List[int]]] = []
+        self.entry: Optional[int] = None
+        self.max_level = -1
+
+    @property
+    def size(self) -> int:
+        """Number of nodes; they are the index ids [0, size)."""
+        return len(self.neighbors)
+
+    def copy(self) -> "_HnswGraph":
+        """An independent copy to insert into while this graph keeps serving searches."""
+        graph = _HnswGraph.__new__(_HnswGraph)
+        graph.__dict__.update(self.__dict__)
+        graph.neighbors = [[list(links) for links in node] for node in self.neighbors]
+        graph.rng = random.Random()
+        graph.rng.setstate(self.rng.getstate())
+        return graph
+
+    def _similarities(self, query: np.ndarray, ids: List[int]) -> np.ndarray:
+        return self.index.vectors(ids) @ query
+
+    def _search_layer(self, query: np.ndarray, entry_points: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+        """Best-first search on one layer; returns up to `ef` (similarity, id) pairs, best first."""
+        visited = set(entry_points)
+        sims = self._similarities(query, entry_points)
+        candidates = [(-s, i) for s, i in zip(sims, entry_points)]
+        results = [(s, i) for s, i in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        heapq.heapify(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+            fresh = [n for n in self.neighbors[node][level] if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for sim, neighbor in zip(self._similarities(query, fresh), fresh):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    heapq.heappush(results, (sim, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _descend(self, query: np.ndarray, down_to: int) -> List[int]:
+        """Greedy search from the entry point through the upper layers."""
+        entry_points = [self.entry]
+        for level in range(self.max_level, down_to, -1):
+            entry_points = [self._search_layer(query, entry_points, 1, level)[0][1]]
+        return entry_points
+
+    def insert(self, node: int) -> None:
+        query = self.index.vectors([node])[0]
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+        self.neighbors.append([[] for _ in range(level + 1)])
+        if self.entry is None:
+            self.entry, self.max_level = node, level
+            return
+
+        entry_points = self._descend(query, level)
+        for lvl in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(query, entry_points, self.ef_construction, lvl)
+            selected = [i for _, i in found[: self.m]]
+            self.neighbors[node][lvl] = selected
+
+            max_links = self.m0 if lvl == 0 else self.m
+            for neighbor in selected:
+                links = self.neighbors[neighbor][lvl]
+                links.append(node)
+                if len(links) > max_links:
+                    # Keep the neighbor's closest links
+                    sims = self._similarities(self.index.vectors([neighbor])[0], links)
+                    keep = np.argsort(-sims)[:max_links]
+                    self.neighbors[neighbor][lvl] = [links[i] for i in keep]
+            entry_points = [i for _, i in found]
+
+        if level > self.max_level:
+            self.entry, self.max_level = node, level
+
+    def search(self, query: np.ndarray, k: int, ef: int) -> Tuple[np.ndarray, np.ndarray]:
+        found = self._search_layer(query, self._descend(query, 0), ef, 0)[:k]
+        return (np.array([i for _, i in found], dtype=np.int64),
+                np.array([s for s, _ in found], dtype=np.float32))
+
+
+class NumpyVectorStore(VectorStore):
+    """LangChain VectorStore over a NumpyVectorIndex, with the chunks themselves in a ChunkStore."""
+
+    def __init__(self, embedding: Embeddings, store: Optional[ChunkStore] = None, **index_kwargs):
+        self._embedding = embedding
+        self._index_kwargs = index_kwargs
+        self.index: Optional[NumpyVectorIndex] = None
+        self.store = store if store is not None else ChunkStore()
+        self._chunk_ids = array("q")  # Vector id -> chunk ID in self.store
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas)
+
+    def add_embeddings(self, texts: List[str], embeddings, metadatas: Optional[List[dict]] = None) -> List[str]:
+        """Add documents with precomputed embeddings (e.g. from an index bundle), skipping the model."""
+        if not len(texts):
+            return []
+        return self.add_chunks(self.store.add_texts(texts, metadatas), embeddings)
+
+    def add_chunks(self, chunk_ids, embeddings=None) -> List[str]:
+        """Index chunks already in the store, embedding their text unless `embeddings` are given."""
+        if not len(chunk_ids):
+            return []
+        if embeddings is None:
+            embeddings = self._embedding.embed_documents([self.store.text(i) for i in chunk_ids])
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.index is None:
+                self.index = NumpyVectorIndex(dim=vectors.shape[1], **self._index_kwargs)
+            # Chunk IDs go in first so a concurrent search never sees a vector id without its chunk
+            self._chunk_ids.extend(chunk_ids)
+            ids = self.index.add(vectors)
+        return [str(i) for i in ids]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        if self.index is None:
+            return []
+        ids, scores = self.index.search(self._embedding.embed_query(query), k)
+        return [(self.store.document(self._chunk_ids[i]), float(s)) for i, s in zip(ids, scores)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities of normalized embeddings already
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs) -> "NumpyVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
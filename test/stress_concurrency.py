@@ -0,0 +1,168 @@
+"""
+Concurrency stress test for the components the Gradio app shares between sessions: one
+DocumentProcessor, RetrieverBuilder, IngestionManager and AgentWorkflow, hit by many sessions
+uploading the same and different files at once, then asking questions in parallel.
+
+Embeddings and chat models are the offline fakes from benchmarks/fakes.py, so no API keys
+are needed (Docling is still used to convert the files).
+
+Run from the repository root:
+    python test/stress_concurrency.py --sessions 16 --sets 4
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agents.model_router import ModelRouter
+from agents.workflow import AgentWorkflow
+from benchmarks.corpus import generate_corpus
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+from config.settings import settings
+from document_processor.file_handler import DocumentProcessor
+from document_processor.ingestion import IngestionManager
+from retriever.builder import RetrieverBuilder, _chroma_client
+from utils.instrumentation import metrics
+
+failures = []
+
+
+def check(ok: bool, message: str) -> None:
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+
+def make_sets(workdir: Path, sets: int, docs: int):
+    """Document sets with distinct file names, so retrieved chunks can be traced to their set."""
+    result = []
+    for i in range(sets):
+        corpus = generate_corpus(str(workdir / f"set_{i}"), docs=docs, sections=8, seed=i)
+        paths = []
+        for path in corpus["file_paths"]:
+            renamed = Path(path).with_name(f"set{i}_{Path(path).name}")
+            os.replace(path, renamed)
+            paths.append(str(renamed))
+        result.append({"file_paths": paths, "questions": corpus["questions"][:3]})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DocChat concurrency stress test")
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--sets", type=int, default=4, help="distinct document sets; half the sessions share set 0")
+    parser.add_argument("--docs", type=int, default=2, help="files per set")
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--streaming", action="store_true", help="ingest with settings.STREAMING_INGEST")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="docchat-stress-"))
+    settings.CACHE_DIR = str(workdir / "cache")
+    settings.CHROMA_DB_PATH = str(workdir / "chroma")
+    settings.VECTOR_BACKEND = args.vector_backend
+    settings.STREAMING_INGEST = args.streaming
+
+    sets = make_sets(workdir, args.sets, args.docs)
+    assignment = [0 if s % 2 == 0 else 1 + (s // 2) % (args.sets - 1) for s in range(args.sessions)] \
+        if args.sets > 1 else [0] * args.sessions
+    distinct_files = len({p for i in set(assignment) for p in sets[i]["file_paths"]})
+
+    processor = DocumentProcessor()
+    builder = RetrieverBuilder(embeddings=FakeEmbeddings())
+    ingestion = IngestionManager(lambda: processor, lambda: builder, max_workers=args.sessions)
+    router = ModelRouter(small=FakeChatModel(model_name="fake-small"), large=FakeChatModel(model_name="fake-large"))
+    workflow = AgentWorkflow(router=router)
+    metrics.reset()
+
+    # 1) All sessions upload at once
+    print(f"\n🔍 {args.sessions} sessions uploading {len(set(assignment))} document sets "
+          f"({distinct_files} distinct files, {args.vector_backend} backend)...")
+    start = threading.Barrier(args.sessions)
+
+    def upload(session: int):
+        start.wait()
+        paths = sets[assignment[session]]["file_paths"]
+        files = [SimpleNamespace(name=p) for p in paths]
+        job = ingestion.submit(f"session-{session}", files, frozenset(paths))
+        retriever = job.wait()
+        if job.future is not None:
+            job.future.result()  # When streaming, wait() returns after the first batch
+        return retriever
+
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [pool.submit(upload, s) for s in range(args.sessions)]
+    retrievers, errors = [], []
+    for future in futures:
+        try:
+            retrievers.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    check(not errors, f"all uploads succeeded ({len(errors)} failed: {errors[:3]})")
+    if errors:
+        sys.exit(1)
+
+    conversions = metrics.snapshot().get("ingest.convert.duration_ms", {}).get("count", 0)
+    check(conversions == distinct_files, f"each distinct file converted once ({conversions} conversions)")
+
+    cache_files = list(Path(settings.CACHE_DIR).iterdir())
+    partial = [p.name for p in cache_files if p.suffix != ".pkl"]
+    check(not partial, f"no partial cache files left behind ({partial})")
+    check(len(cache_files) - len(partial) == distinct_files, f"one cache file per distinct file ({len(cache_files)})")
+    unreadable = [p.name for p in cache_files if p.suffix == ".pkl" and processor._load_cached(p) is None]
+    check(not unreadable, f"all cache files load ({unreadable})")
+
+    # 2) Every session only sees its own documents
+    leaks = 0
+    for session, retriever in enumerate(retrievers):
+        own = {Path(p).name for p in sets[assignment[session]]["file_paths"]}
+        for question in sets[assignment[session]]["questions"]:
+            leaks += sum(doc.metadata.get("source") not in own for doc in retriever.invoke(question))
+    check(leaks == 0, f"retrievers return only their own session's chunks ({leaks} foreign chunks)")
+
+    # 3) All sessions ask their questions at once
+    def ask(session: int):
+        answers = []
+        conversation = workflow.new_session()
+        for question in sets[assignment[session]]["questions"]:
+            result = workflow.full_pipeline(question, retrievers[session], session=conversation)
+            answers.append(result["draft_answer"])
+        return answers
+
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [pool.submit(ask, s) for s in range(args.sessions)]
+    errors, empty = [], 0
+    for future in futures:
+        try:
+            empty += sum(not answer for answer in future.result())
+        except Exception as e:
+            errors.append(e)
+    check(not errors, f"all questions answered ({len(errors)} failed: {errors[:3]})")
+    check(empty == 0, f"no empty answers ({empty})")
+
+    # 4) Session-scoped Chroma collections go away with their retrievers
+    if args.vector_backend == "chroma":
+        client = _chroma_client(settings.CHROMA_DB_PATH)
+        before = len(client.list_collections())
+        check(before == len({id(r) for r in retrievers}), f"one Chroma collection per retriever ({before})")
+        del retriever
+        retrievers.clear()
+        for session in range(args.sessions):
+            ingestion.discard(f"session-{session}")
+        gc.collect()
+        after = len(client.list_collections())
+        check(after == 0, f"collections dropped once retrievers are released ({after} left)")
+
+    print(f"\n{'❌ ' + str(len(failures)) + ' check(s) failed' if failures else '✅ All checks passed'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
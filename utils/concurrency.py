@@ -0,0 +1,52 @@
+"""
+Helpers for resources shared by concurrent requests. Key features include:
+
+1. KeyedLocks: one lock per key (e.g. a cache file), created on demand and dropped once no
+   thread holds or waits for it
+2. atomic_write: write a file under a temporary name and move it into place, so readers
+   (in this or another process) never see a partial file
+"""
+
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Hashable, List
+
+
+class KeyedLocks:
+    def __init__(self):
+        self._locks: Dict[Hashable, List] = {}  # key -> [lock, holders and waiters]
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def lock(self, key: Hashable):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+@contextmanager
+def atomic_write(path, mode: str = "wb"):
+    """Yield a file object for a temporary file next to `path`; it replaces `path` if the block succeeds."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
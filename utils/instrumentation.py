@@ -0,0 +1,226 @@
+"""
+Lightweight instrumentation for the DocChat pipeline. Key features include:
+
+1. A per-request trace ID carried in a context variable (and in AgentState)
+2. Stage timers that emit structured log records and feed in-process histograms
+3. Prompt/completion token accounting for every LLM call
+4. A histogram API (`metrics`) for querying latency and token distributions at runtime
+5. Per-scope token totals (e.g. for one conversation turn) via `llm_usage_scope`
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+from utils.logging import logger
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar("trace_id", default=None)
+_usage_scopes: contextvars.ContextVar = contextvars.ContextVar("llm_usage_scopes", default=())
+
+
+def _percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile (0-100) of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def new_trace_id() -> str:
+    """Generate a short random trace ID."""
+    return uuid.uuid4().hex[:16]
+
+
+def get_trace_id() -> Optional[str]:
+    """Return the trace ID bound to the current context, if any."""
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str] = None):
+    """
+    Bind a trace ID to the current context for the duration of the block.
+
+    Reuses the given ID (e.g. one carried in AgentState) or generates a new one.
+    """
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+class Histogram:
+    """
+    Bounded reservoir of observations with percentile summaries.
+
+    Only the most recent `max_samples` values are kept so that a long-running
+    process does not grow without bound.
+    """
+
+    def __init__(self, max_samples: int = 10_000):
+        self._samples = deque(maxlen=max_samples)
+        self._count = 0
+        self._total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._samples.append(value)
+            self._count += 1
+            self._total += value
+
+    def percentile(self, q: float) -> float:
+        """Return the q-th percentile (0-100) of the retained samples."""
+        with self._lock:
+            values = sorted(self._samples)
+        return _percentile(values, q)
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            values = sorted(self._samples)
+            count, total = self._count, self._total
+        if not values:
+            return {"count": 0}
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count,
+            "min": values[0],
+            "max": values[-1],
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe registry of named histograms."""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            return self._histograms[name]
+
+    def observe(self, name: str, value: float) -> None:
+        self.histogram(name).observe(value)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return summaries for every histogram recorded so far."""
+        with self._lock:
+            items = list(self._histograms.items())
+        return {name: hist.summary() for name, hist in sorted(items)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def timed(stage: str, **fields):
+    """
+    Time a pipeline stage.
+
+    * Records the duration in the `<stage>.duration_ms` histogram
+    * Emits a structured log record tagged with the current trace ID
+    * Yields a dict so the caller can attach extra fields (e.g. chunk counts)
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        metrics.observe(f"{stage}.duration_ms", duration_ms)
+        logger.bind(
+            metric="stage",
+            stage=stage,
+            trace_id=get_trace_id(),
+            duration_ms=round(duration_ms, 3),
+            status=status,
+            **fields,
+        ).info(f"{stage} took {duration_ms:.1f} ms")
+
+
+def record_llm_usage(stage: str, response, model: Optional[str] = None) -> Dict[str, int]:
+    """
+    Record prompt and completion token counts for an LLM response.
+
+    Reads LangChain's `usage_metadata`, falling back to the provider's
+    `token_usage` block in `response_metadata`.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens")
+    completion_tokens = usage.get("output_tokens")
+
+    if prompt_tokens is None or completion_tokens is None:
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+
+    metrics.observe(f"{stage}.prompt_tokens", prompt_tokens)
+    metrics.observe(f"{stage}.completion_tokens", completion_tokens)
+    for totals in _usage_scopes.get():
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+    logger.bind(
+        metric="llm_usage",
+        stage=stage,
+        trace_id=get_trace_id(),
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+    ).info(f"{stage} used {prompt_tokens} prompt + {completion_tokens} completion tokens")
+
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+@contextmanager
+def llm_usage_scope():
+    """
+    Total the LLM calls and tokens recorded inside the block.
+
+    Yields a dict (calls, prompt_tokens, completion_tokens) that is updated as calls are
+    recorded, including from threads that copied this context. Scopes nest: a call counts
+    towards every enclosing scope.
+    """
+    totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    token = _usage_scopes.set(_usage_scopes.get() + (totals,))
+    try:
+        yield totals
+    finally:
+        _usage_scopes.reset(token)
+
+
+def instrument_node(name: str):
+    """
+    Decorator for LangGraph node functions.
+
+    Re-binds the trace ID carried in the state (LangGraph may run nodes in a
+    different context) and times the node as `node.<name>`.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, state, *args, **kwargs):
+            with trace(state.get("trace_id")):
+                with timed(f"node.{name}"):
+                    return func(self, state, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,65 @@
+"""
+Deferred initialization for heavy components (Docling, embeddings, LLM clients, the compiled graph).
+
+A LazyResource builds its object on first use, exactly once, even with concurrent callers.
+prewarm() builds a set of resources on a background thread so the first request doesn't pay for it.
+"""
+
+import contextvars
+import threading
+from typing import Callable, Iterable, Optional
+
+from utils.instrumentation import timed
+from utils.logging import logger
+
+
+class LazyResource:
+    def __init__(self, name: str, factory: Callable, warmup: Optional[Callable] = None):
+        """
+        * `factory` builds the object (heavy imports belong inside it)
+        * `warmup`, if given, is called with the built object during prewarm() only
+        """
+        self.name = name
+        self._factory = factory
+        self._warmup = warmup
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    def get(self):
+        """Return the object, building it on the first call."""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with timed(f"startup.init.{self.name}"):
+                        self._instance = self._factory()
+        return self._instance
+
+    def warm(self) -> None:
+        """Build the object and run its warmup hook."""
+        instance = self.get()
+        if self._warmup is not None:
+            with timed(f"startup.warmup.{self.name}"):
+                self._warmup(instance)
+
+
+def prewarm(resources: Iterable[LazyResource]) -> threading.Thread:
+    """Warm the given resources one after another on a daemon thread."""
+    resources = list(resources)
+
+    def run():
+        for resource in resources:
+            try:
+                resource.warm()
+            except Exception as e:
+                # Not fatal: the resource is retried (and the error surfaced) on first real use
+                logger.warning(f"Prewarming {resource.name} failed: {e}")
+        logger.info("Prewarming complete.")
+
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(run,), name="docchat-prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -1,8 +1,81 @@
+"""
+Shared loguru setup for DocChat. Key features include:
+
+1. All sinks are queue-backed (enqueue=True) so logging never blocks the request thread on I/O
+2. A single level (settings.LOG_LEVEL) controls stderr and app.log
+3. `log_payload` for prompts, responses and context: lazily formatted, truncated and sampled,
+   so DEBUG-level payloads cost nothing when DEBUG is disabled
+"""
+
+import random
+import sys
+
 from loguru import logger
 
+from config.settings import settings
+
+
+def _sampled(record) -> bool:
+    """Drop records bound with a `sample_rate` below 1.0 with the matching probability."""
+    return random.random() < record["extra"].get("sample_rate", 1.0)
+
+
+# Replace loguru's default synchronous stderr handler
+logger.remove()
+
+# Instrumentation records are kept out of the console; they go to app.log and metrics.log
+logger.add(
+    sys.stderr,
+    level=settings.LOG_LEVEL,
+    enqueue=True,
+    filter=lambda record: "metric" not in record["extra"] and _sampled(record)
+)
+
 logger.add(
     "app.log",
+    level=settings.LOG_LEVEL,
     rotation="10 MB",
     retention="30 days",
+    enqueue=True,
+    filter=_sampled,
     format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
-)
\ No newline at end of file
+)
+
+# Structured (JSON lines) sink for instrumentation records emitted by utils.instrumentation
+logger.add(
+    "metrics.log",
+    level="INFO",
+    rotation="10 MB",
+    retention="30 days",
+    serialize=True,
+    enqueue=True,
+    filter=lambda record: "metric" in record["extra"]
+)
+
+# Lowest level accepted by any sink; anything below is dropped before formatting
+_MIN_LEVEL_NO = min(logger.level(settings.LOG_LEVEL.upper()).no, logger.level("INFO").no)
+_payload_logger = logger.bind(sample_rate=settings.LOG_PAYLOAD_SAMPLE_RATE)
+
+
+def truncate(text: str, limit: int = None) -> str:
+    """Shorten text to `limit` characters (settings.LOG_PAYLOAD_LIMIT by default)."""
+    limit = settings.LOG_PAYLOAD_LIMIT if limit is None else limit
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [truncated {len(text) - limit} chars]"
+
+
+def log_payload(label: str, text: str, level: str = "DEBUG", limit: int = None) -> None:
+    """
+    Log a potentially large payload (prompt, response, context).
+
+    * Returns immediately when `level` is below every sink's threshold
+    * Truncation runs lazily, only if the record is going to be emitted
+    * Records are sampled at settings.LOG_PAYLOAD_SAMPLE_RATE
+    """
+    if logger.level(level).no < _MIN_LEVEL_NO:
+        return
+    _payload_logger.opt(lazy=True, depth=1).log(
+        level, label + ":\n{}", lambda: truncate(text, limit)
+    )
@@ -0,0 +1,158 @@
+"""
+Opt-in profiling of individual requests. Key features include:
+
+1. `profile(name)` sections around the pipeline entry points (question answering, ingestion),
+   which cost one flag check unless profiling is on
+2. Profiling is on for every request with settings.PROFILING_ENABLED, or per request inside
+   `profile_request()` (the app enables it for requests carrying settings.PROFILING_HEADER)
+3. A sampling profiler (default) writing folded stacks ("frame;frame;frame count" lines, as read
+   by flamegraph.pl, speedscope and inferno), or cProfile writing a pstats file
+4. Files are named by trace ID and section, in settings.PROFILING_DIR, which is pruned to the
+   newest settings.PROFILING_MAX_FILES files
+
+Usage:
+    PROFILING_ENABLED=true python app.py
+    curl -H "X-DocChat-Profile: 1" ...        # or per request, with the header
+    flamegraph.pl profiles/<trace_id>-full_pipeline.folded > flame.svg
+"""
+
+import contextvars
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from config.settings import settings
+from utils.instrumentation import get_trace_id, new_trace_id
+from utils.logging import logger
+
+_requested: contextvars.ContextVar = contextvars.ContextVar("profiling_requested", default=False)
+_active: contextvars.ContextVar = contextvars.ContextVar("profiling_active", default=False)
+_cprofile_lock = threading.Lock()  # Only one deterministic profiler can run per process
+
+
+@contextmanager
+def profile_request(enabled: bool = True):
+    """Profile the `profile()` sections run in this context (e.g. while handling one request)."""
+    token = _requested.set(enabled)
+    try:
+        yield
+    finally:
+        _requested.reset(token)
+
+
+def profiling_enabled() -> bool:
+    return settings.PROFILING_ENABLED or _requested.get()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every `interval_s` seconds from a background thread."""
+
+    def __init__(self, thread_id: int, interval_s: float, skip_frames: int = 0):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.skip_frames = skip_frames  # Outermost frames (callers of the profiled section) left out
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="docchat-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            if len(stack) > self.skip_frames:
+                self.stacks[";".join(stack[self.skip_frames:])] += 1
+
+    def write(self, path: Path) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _prune(directory: Path, keep: int) -> None:
+    """Delete all but the `keep` newest profiles."""
+    files = []
+    for path in directory.iterdir():
+        try:
+            files.append((path.stat().st_mtime, path))
+        except FileNotFoundError:  # Pruned concurrently
+            pass
+    for _, path in sorted(files, reverse=True)[keep:]:
+        path.unlink(missing_ok=True)
+
+
+class profile:
+    """
+    Profile the enclosed block if profiling is enabled for this request; nested sections are
+    covered by the outermost one.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._profiler = None
+
+    def __enter__(self):
+        if not profiling_enabled() or _active.get():
+            return self
+        if settings.PROFILING_MODE == "cprofile":
+            if not _cprofile_lock.acquire(blocking=False):
+                logger.warning(f"Not profiling {self.name}: another cProfile session is running")
+                return self
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            depth, frame = 0, sys._getframe(1).f_back  # Callers of the block's frame
+            while frame is not None:
+                depth, frame = depth + 1, frame.f_back
+            self._profiler = SamplingProfiler(threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000, depth)
+            self._profiler.start()
+        self._token = _active.set(True)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is None:
+            return False
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        _active.reset(self._token)
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.disable()
+            _cprofile_lock.release()
+        else:
+            self._profiler.stop()
+
+        try:
+            directory = Path(settings.PROFILING_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            stem = f"{get_trace_id() or new_trace_id()}-{self.name}"
+            if isinstance(self._profiler, cProfile.Profile):
+                path = directory / f"{stem}.prof"
+                self._profiler.dump_stats(path)
+            else:
+                path = directory / f"{stem}.folded"
+                self._profiler.write(path)
+            _prune(directory, settings.PROFILING_MAX_FILES)
+            logger.info(f"Profile of {self.name} ({elapsed_ms:.0f} ms) written to {path}")
+        except OSError as e:
+            logger.warning(f"Could not write profile of {self.name}: {e}")
+        self._profiler = None
+        return False
@@ -0,0 +1,37 @@
+"""
+Token counting shared by chunking and prompt budgeting.
+
+Uses tiktoken's cl100k_base encoding when it can be loaded (it is downloaded on first use);
+offline, falls back to a regex estimate of roughly 1.3 tokens per word. The two give different
+counts, so tokenizer_name() is recorded wherever counts shape stored data (e.g. chunk boundaries).
+"""
+
+import re
+from functools import lru_cache
+
+from utils.logging import logger
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def tokenizer_name() -> str:
+    """The tokenizer count_tokens() uses in this process: "cl100k_base" or "regex-estimate"."""
+    return "cl100k_base" if _encoding() is not None else "regex-estimate"
+
+
+def count_tokens(text: str) -> int:
+    """Return the (possibly estimated) number of tokens in `text`."""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(len(_WORD_RE.findall(text)) * 1.3)